@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+# Layout under a model directory:
+#   versions/v000001/models.joblib     fitted estimators (uncompressed, mmap-able)
+#   versions/v000001/training_data.npy training buffer the models were fitted on
+#   versions/v000001/manifest.json     metrics, scaler stats, shapes, timestamps
+#   CURRENT                            version number being served
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+MODELS_FILE = "models.joblib"
+TRAINING_FILE = "training_data.npy"
+MANIFEST_FILE = "manifest.json"
+
+
+def _version_name(version: int) -> str:
+    return f"v{version:06d}"
+
+
+def version_path(model_dir: str, version: int) -> str:
+    return os.path.join(model_dir, VERSIONS_DIR, _version_name(version))
+
+
+def list_versions(model_dir: str) -> List[int]:
+    """Complete versions on disk, oldest first"""
+    try:
+        names = os.listdir(os.path.join(model_dir, VERSIONS_DIR))
+    except FileNotFoundError:
+        return []
+    versions = []
+    for name in names:
+        if name.startswith("v") and name[1:].isdigit():
+            versions.append(int(name[1:]))
+    return sorted(versions)
+
+
+def _write_file_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_version(model_dir: str, models: Dict[str, Any], samples: np.ndarray,
+                  manifest: Dict) -> int:
+    """Write a new version and return its number; it is not served until published.
+
+    Everything goes into a private temporary directory that is renamed into
+    place in one step, so readers never see a half-written version.
+    """
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    tmp = os.path.join(versions_dir, f".tmp-{os.getpid()}-{time.monotonic_ns()}")
+    os.makedirs(tmp)
+    try:
+        joblib.dump(models, os.path.join(tmp, MODELS_FILE))
+        np.save(os.path.join(tmp, TRAINING_FILE), np.ascontiguousarray(samples))
+        versions = list_versions(model_dir)
+        version = (versions[-1] if versions else 0) + 1
+        while True:
+            manifest = {**manifest, "version": version, "created_at": time.time()}
+            with open(os.path.join(tmp, MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f)
+            try:
+                # rename() fails if another writer already claimed this number
+                os.rename(tmp, version_path(model_dir, version))
+                return version
+            except OSError:
+                if not os.path.exists(version_path(model_dir, version)):
+                    raise
+                version += 1
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def publish(model_dir: str, version: int):
+    """Atomically point CURRENT at `version`"""
+    if not os.path.isdir(version_path(model_dir, version)):
+        raise FileNotFoundError(f"model version {version} does not exist")
+    _write_file_atomic(os.path.join(model_dir, CURRENT_FILE), str(version).encode())
+
+
+def current_version(model_dir: str) -> Optional[int]:
+    """The published version, or the newest one if nothing was published yet"""
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE)) as f:
+            version = int(f.read().strip())
+        if os.path.isdir(version_path(model_dir, version)):
+            return version
+    except (OSError, ValueError):
+        pass
+    versions = list_versions(model_dir)
+    return versions[-1] if versions else None
+
+
+def read_manifest(model_dir: str, version: int) -> Dict:
+    with open(os.path.join(version_path(model_dir, version), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def read_version(model_dir: str, version: int, mmap: bool = True) -> Tuple[Dict[str, Any], np.ndarray, Dict]:
+    """Load (models, training samples, manifest) for one version.
+
+    With `mmap` the large numpy arrays are memory-mapped read-only instead of
+    being read into memory, so loading cost does not grow with model size.
+    """
+    path = version_path(model_dir, version)
+    mmap_mode = "r" if mmap else None
+    models = joblib.load(os.path.join(path, MODELS_FILE), mmap_mode=mmap_mode)
+    samples = np.load(os.path.join(path, TRAINING_FILE), mmap_mode=mmap_mode)
+    return models, samples, read_manifest(model_dir, version)
+
+
+def prune(model_dir: str, keep: int):
+    """Delete all but the newest `keep` versions, never the published one"""
+    current = current_version(model_dir)
+    versions = list_versions(model_dir)
+    for version in versions[:max(0, len(versions) - keep)]:
+        if version != current:
+            shutil.rmtree(version_path(model_dir, version), ignore_errors=True)
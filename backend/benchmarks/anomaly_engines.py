@@ -0,0 +1,137 @@
+"""Compare the IsolationForest and streaming anomaly engines.
+
+Feeds both engines the same synthetic sensor stream with injected spikes,
+then reports per-point latency, batch throughput and how often the two
+engines agree. IsolationForest is fitted on an independent draw of the
+same time span, so its calendar features see familiar values; the
+streaming detector only warms up on the readings before the test stream.
+Run from backend/:
+
+    python benchmarks/anomaly_engines.py [--points 5000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml_models import StreamingAnomalyDetector, extract_features_batch, fit_models  # noqa: E402
+
+
+def synthetic_stream(n: int, anomaly_rate: float, seed: int, t0: float = 1.7e9):
+    """Readings shaped like the /ws generator, with labelled spikes"""
+    rng = np.random.default_rng(seed)
+    i = np.arange(n)
+    columns = {
+        "timestamp": t0 + i,
+        "temperature": 20 + 5 * np.sin(i / 600) + rng.normal(0, 0.3, n),
+        "humidity": 50 + 10 * np.cos(i / 900) + rng.normal(0, 1.0, n),
+        "cpu_usage": np.clip(35 + 15 * np.sin(i / 120) + rng.normal(0, 4, n), 0, 100),
+        "memory_usage": np.clip(55 + rng.normal(0, 2, n), 0, 100),
+        "network_speed": 50 + rng.normal(0, 8, n),
+    }
+    labels = rng.random(n) < anomaly_rate
+    fields = ["temperature", "humidity", "cpu_usage", "memory_usage", "network_speed"]
+    for row in np.flatnonzero(labels):
+        field = fields[rng.integers(len(fields))]
+        columns[field][row] += rng.choice([-1, 1]) * rng.uniform(25, 60)
+    return extract_features_batch(columns), labels
+
+
+def percentiles(samples_ns):
+    us = np.asarray(samples_ns) / 1000
+    return {"p50_us": round(float(np.percentile(us, 50)), 2),
+            "p99_us": round(float(np.percentile(us, 99)), 2),
+            "mean_us": round(float(us.mean()), 2)}
+
+
+def detection(flags, labels):
+    hits = int(np.count_nonzero(flags & labels))
+    return {
+        "flag_rate": round(float(flags.mean()), 4),
+        "precision": round(hits / max(1, int(flags.sum())), 4),
+        "recall": round(hits / max(1, int(labels.sum())), 4),
+    }
+
+
+def run(points: int, warmup: int, anomaly_rate: float, seed: int):
+    features, labels = synthetic_stream(warmup + points, anomaly_rate, seed)
+    train, test, test_labels = features[:warmup], features[warmup:], labels[warmup:]
+    reference, _ = synthetic_stream(warmup + points, anomaly_rate, seed + 1)
+
+    bundle = fit_models(reference[::max(1, len(reference) // 2000)])
+    scaler, forest = bundle.scaler, bundle.anomaly_detector
+    detector = StreamingAnomalyDetector()
+    detector.update(train)
+
+    # Per-point latency: one reading at a time, as add_data_point sees them
+    forest_ns, stream_ns = [], []
+    forest_flags = np.zeros(points, dtype=bool)
+    stream_flags = np.zeros(points, dtype=bool)
+    for i in range(points):
+        row = test[i:i + 1]
+        start = time.perf_counter_ns()
+        forest_flags[i] = forest.decision_function(scaler.transform(row))[0] < 0
+        forest_ns.append(time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
+        stream_flags[i] = detector.update(row)[1][0]
+        stream_ns.append(time.perf_counter_ns() - start)
+
+    # Batch throughput on the whole test stream
+    start = time.perf_counter()
+    forest.decision_function(scaler.transform(test))
+    forest_batch = time.perf_counter() - start
+    batch_detector = StreamingAnomalyDetector()
+    batch_detector.update(train)
+    start = time.perf_counter()
+    batch_detector.update(test)
+    stream_batch = time.perf_counter() - start
+
+    agree = forest_flags == stream_flags
+    p_observed = float(agree.mean())
+    p_forest, p_stream = forest_flags.mean(), stream_flags.mean()
+    p_chance = p_forest * p_stream + (1 - p_forest) * (1 - p_stream)
+    kappa = (p_observed - p_chance) / (1 - p_chance) if p_chance < 1 else 1.0
+
+    return {
+        "points": points,
+        "warmup": warmup,
+        "injected_anomalies": int(test_labels.sum()),
+        "isolation_forest": {
+            "per_point": percentiles(forest_ns),
+            "batch_rows_per_second": round(points / forest_batch),
+            **detection(forest_flags, test_labels),
+        },
+        "streaming": {
+            "per_point": percentiles(stream_ns),
+            "batch_rows_per_second": round(points / stream_batch),
+            **detection(stream_flags, test_labels),
+        },
+        "agreement": round(p_observed, 4),
+        "cohen_kappa": round(float(kappa), 4),
+        "both_flagged": int(np.count_nonzero(forest_flags & stream_flags)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=5000, help="readings scored per engine")
+    parser.add_argument("--warmup", type=int, default=1000, help="readings used to fit/warm up")
+    parser.add_argument("--anomaly-rate", type=float, default=0.01, help="fraction of injected spikes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.points, args.warmup, args.anomaly_rate, args.seed)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Local stand-in for the Open-Meteo forecast API.
+
+Answers every GET with a fixed "current" block so the backend can run
+without network access and with a known upstream latency. Point the
+backend at it with WEATHER_API_URL. Run from backend/:
+
+    python benchmarks/fake_open_meteo.py [--port 8765] [--delay-ms 0]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenMeteo:
+    """Threaded HTTP server returning current temperature/humidity.
+
+    Use as a context manager; `url` is the endpoint to configure and
+    `requests` counts the calls served.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, temperature: float = 18.5,
+                 humidity: float = 62.0, delay: float = 0.0):
+        self.payload = json.dumps({
+            "current": {"temperature_2m": temperature, "relative_humidity_2m": humidity},
+        }).encode()
+        self.delay = delay
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(fake.payload)))
+                self.end_headers()
+                self.wfile.write(fake.payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def start(self) -> "FakeOpenMeteo":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeOpenMeteo":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="added latency per response")
+    args = parser.parse_args()
+
+    fake = FakeOpenMeteo(args.host, args.port, delay=args.delay_ms / 1000)
+    print(f"serving {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
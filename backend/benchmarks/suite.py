@@ -0,0 +1,420 @@
+"""Load, latency and ML timing benchmarks for the backend.
+
+Starts the app under uvicorn in a child process, with fresh data
+directories and a local Open-Meteo stand-in (fake_open_meteo.py). It then
+measures:
+
+- http: throughput and p50/p99 latency of /data, /metrics and /stats
+  under a fixed concurrency
+- ws: delivery lag (receive time - reading timestamp) and inter-arrival
+  jitter seen by N concurrent /ws clients
+- ml: SensorDataML.add_data_point, train_models and feature extraction
+  at several training buffer sizes, in this process
+
+Results are written as JSON to benchmarks/results/. If a baseline exists,
+every timing is compared against it, and the exit status is 1 when one
+regressed by more than --tolerance. Run from backend/:
+
+    python benchmarks/suite.py [--only http,ws,ml] [--save-baseline]
+
+--workers N runs the app with N uvicorn workers in multi-worker mode
+(SHARED_STATE_DIR), to compare scaling against a single process.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_open_meteo import FakeOpenMeteo  # noqa: E402
+from ml_models import FeaturePipeline, SensorDataML, extract_features_batch, readings_to_columns  # noqa: E402
+from synthetic import generate, to_records  # noqa: E402
+from ws_protocol import BINARY_HEADER, msgpack  # noqa: E402
+
+SUITES = ("http", "ws", "ml")
+HTTP_ENDPOINTS = ("/data", "/metrics", "/stats")
+
+
+def percentiles(seconds, unit: str = "ms"):
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+    values = np.asarray(seconds, dtype=np.float64) * scale
+    if not len(values):
+        # Same keys with nulls, so reports keep their shape and comparisons skip them
+        return {f"p50_{unit}": None, f"p99_{unit}": None, f"mean_{unit}": None}
+    return {f"p50_{unit}": round(float(np.percentile(values, 50)), 3),
+            f"p99_{unit}": round(float(np.percentile(values, 99)), 3),
+            f"mean_{unit}": round(float(values.mean()), 3)}
+
+
+def synthetic_readings(n: int, seed: int, t0: float = 1.7e9):
+    """Readings from the live generator's signal model, one per second"""
+    return to_records(generate(n, seed=seed, start=t0))
+
+
+# -- app under test ---------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class AppServer:
+    """The backend in a uvicorn child process with throwaway data directories"""
+
+    def __init__(self, weather_url: str, stream_interval: float, workdir: str, workers: int = 1):
+        self.port = _free_port()
+        self.workdir = workdir
+        self.workers = workers
+        self.log_path = os.path.join(workdir, "server.log")
+        self.env = {
+            **os.environ,
+            "WEATHER_API_URL": weather_url,
+            "HISTORY_DIR": os.path.join(workdir, "history"),
+            "ML_MODEL_DIR": os.path.join(workdir, "models"),
+            "STREAM_INTERVAL": str(stream_interval),
+        }
+        if workers > 1:
+            self.env["SHARED_STATE_DIR"] = os.path.join(workdir, "shared")
+        self.process = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 60.0):
+        with open(self.log_path, "wb") as log:
+            self.process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                 "--port", str(self.port), "--workers", str(self.workers),
+                 "--log-level", "warning", "--no-access-log"],
+                cwd=BACKEND_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                # Ready once the producer (the elected leader's, with several workers) has a reading
+                if httpx.get(f"{self.url}/data", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        with open(self.log_path) as f:
+            raise RuntimeError(f"backend did not start:\n{f.read()[-2000:]}")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+# -- http -------------------------------------------------------------------
+
+async def _load(client: httpx.AsyncClient, path: str, requests: int, concurrency: int):
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                resp = await client.get(path)
+                ok = resp.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        **percentiles(latencies),
+    }
+
+
+async def bench_http(base_url: str, requests: int, concurrency: int, warmup: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        results = {}
+        for path in HTTP_ENDPOINTS:
+            await _load(client, path, warmup, concurrency)
+            results[path] = await _load(client, path, requests, concurrency)
+        return results
+
+
+# -- ws ---------------------------------------------------------------------
+
+def _frame_timestamp(frame, fmt: str):
+    """Reading timestamp of a /ws frame, None for control messages"""
+    if fmt == "binary" and isinstance(frame, bytes):
+        return BINARY_HEADER.unpack_from(frame)[2]
+    if fmt == "msgpack" and isinstance(frame, bytes):
+        return msgpack.unpackb(frame).get("timestamp")
+    message = json.loads(frame)
+    return None if "type" in message else message.get("timestamp")
+
+
+async def _ws_client(url: str, fmt: str, duration: float, window: dict, ready: asyncio.Event):
+    arrivals, lags = [], []
+    async with websockets.connect(url, max_size=None) as ws:
+        await ready.wait()
+        deadline = time.perf_counter() + duration
+        while True:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                frame = await asyncio.wait_for(ws.recv(), timeout)
+            except asyncio.TimeoutError:
+                break
+            received = time.time()
+            timestamp = _frame_timestamp(frame, fmt)
+            # Frames queued before the window opened would inflate lag and count
+            if timestamp is not None and timestamp >= window["start"]:
+                arrivals.append(time.perf_counter())
+                lags.append(received - timestamp)
+    return arrivals, lags
+
+
+async def bench_ws(base_url: str, clients: int, duration: float, query: str, interval: float):
+    params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+    fmt = params.get("format", "json")
+    url = base_url.replace("http://", "ws://") + "/ws" + (f"?{query}" if query else "")
+    ready, window = asyncio.Event(), {}
+    tasks = [asyncio.create_task(_ws_client(url, fmt, duration, window, ready)) for _ in range(clients)]
+    # Let every client connect before the measurement window starts
+    await asyncio.sleep(min(2.0, 0.05 + clients * 0.01))
+    window["start"] = time.time()
+    ready.set()
+    received = await asyncio.gather(*tasks)
+
+    # Short windows, slow servers or a low rate= can leave clients with fewer than two frames
+    lags = np.concatenate([np.asarray(lag, dtype=np.float64) for _, lag in received] or [np.empty(0)])
+    gaps = np.concatenate([np.diff(arrivals) for arrivals, _ in received if len(arrivals) > 1]
+                          or [np.empty(0)])
+    expected = clients * duration / interval
+    return {
+        "clients": clients,
+        "query": query,
+        "interval_s": interval,
+        "frames": int(len(lags)),
+        "delivery_ratio": round(len(lags) / expected, 4) if expected else None,
+        "lag": {**percentiles(lags), "max_ms": round(float(lags.max()) * 1e3, 3) if len(lags) else None},
+        "jitter": {
+            "std_ms": round(float(gaps.std()) * 1e3, 3) if len(gaps) else None,
+            **percentiles(np.abs(gaps - interval)),
+        },
+    }
+
+
+# -- ml ---------------------------------------------------------------------
+
+def bench_ml(buffer_sizes, points: int, seed: int, workdir: str):
+    results = {}
+    for size in buffer_sizes:
+        readings = synthetic_readings(size + points, seed)
+        fill, stream = readings[:size], readings[size:]
+
+        runs = []
+        for _ in range(5):
+            start = time.perf_counter()
+            extract_features_batch(readings_to_columns(fill))
+            runs.append(time.perf_counter() - start)
+        extraction = float(np.median(runs))
+
+        pipeline, pushes = FeaturePipeline(5), []
+        for reading in fill[:points]:
+            start = time.perf_counter()
+            pipeline.push(reading)
+            pushes.append(time.perf_counter() - start)
+
+        model = SensorDataML(model_dir=os.path.join(workdir, f"ml-{size}"), max_training_samples=size)
+        model.add_columns(readings_to_columns(fill))
+        start = time.perf_counter()
+        trained = model.train_models()
+        train_seconds = time.perf_counter() - start
+        if "error" in trained:
+            raise RuntimeError(f"training on {size} samples failed: {trained}")
+
+        latencies = []
+        for reading in stream:
+            start = time.perf_counter()
+            model.add_data_point(reading)
+            latencies.append(time.perf_counter() - start)
+
+        results[str(size)] = {
+            "feature_extraction": {
+                "rows": size,
+                "seconds": round(extraction, 6),
+                "rows_per_second": round(size / extraction),
+                "per_point": percentiles(pushes, "us"),
+            },
+            "train_models": {"seconds": round(train_seconds, 4)},
+            "add_data_point": {"points": points, **percentiles(latencies, "us")},
+        }
+    return results
+
+
+# -- baseline ---------------------------------------------------------------
+
+def flatten(results, prefix: str = ""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def _direction(metric: str):
+    """+1 if higher is better, -1 if lower is better, None if not a timing"""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_second"):
+        return 1
+    if leaf.endswith(("_ms", "_us", "seconds")):
+        return -1
+    return None
+
+
+def compare(results, baseline, tolerance: float):
+    """Relative change of every timing shared with the baseline"""
+    current = flatten({k: v for k, v in results.items() if k in SUITES})
+    previous = flatten({k: v for k, v in baseline.items() if k in SUITES})
+    metrics, regressions = {}, []
+    for name, value in current.items():
+        direction = _direction(name)
+        before = previous.get(name)
+        if direction is None or not before:
+            continue
+        change = (value - before) / before
+        regressed = -direction * change > tolerance
+        metrics[name] = {"baseline": before, "current": value, "change": round(change, 4),
+                         "regression": regressed}
+        if regressed:
+            regressions.append(name)
+    return {"tolerance": tolerance, "baseline_created_at": baseline.get("meta", {}).get("created_at"),
+            "regressions": regressions, "metrics": metrics}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args) -> dict:
+    suites = [s.strip() for s in args.only.split(",") if s.strip()] if args.only else list(SUITES)
+    unknown = [s for s in suites if s not in SUITES]
+    if unknown:
+        raise SystemExit(f"unknown suites: {', '.join(unknown)}")
+
+    results = {"meta": {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("save_baseline",)},
+    }}
+    workdir = tempfile.mkdtemp(prefix="backend-bench-")
+    try:
+        if "http" in suites or "ws" in suites:
+            with FakeOpenMeteo() as weather:
+                server = AppServer(weather.url, args.stream_interval, workdir, args.workers)
+                server.start()
+                try:
+                    if "http" in suites:
+                        results["http"] = asyncio.run(
+                            bench_http(server.url, args.requests, args.concurrency, args.warmup))
+                    if "ws" in suites:
+                        results["ws"] = asyncio.run(bench_ws(
+                            server.url, args.ws_clients, args.ws_duration, args.ws_query,
+                            args.stream_interval))
+                finally:
+                    server.stop()
+                results["meta"]["weather_upstream_requests"] = weather.requests
+        if "ml" in suites:
+            sizes = [int(s) for s in args.buffer_sizes.split(",")]
+            results["ml"] = bench_ml(sizes, args.ml_points, args.seed, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=1,
+                        help="uvicorn workers; more than one runs multi-worker mode")
+    parser.add_argument("--only", help=f"comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per endpoint")
+    parser.add_argument("--ws-clients", type=int, default=50, help="concurrent /ws clients")
+    parser.add_argument("--ws-duration", type=float, default=10.0, help="seconds to listen")
+    parser.add_argument("--ws-query", default="", help="/ws query string, e.g. format=binary")
+    parser.add_argument("--stream-interval", type=float, default=0.1,
+                        help="STREAM_INTERVAL for the app under test")
+    parser.add_argument("--buffer-sizes", default="1000,5000,10000", help="training buffer sizes")
+    parser.add_argument("--ml-points", type=int, default=500, help="add_data_point calls timed per size")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results file (default: results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=os.path.join(RESULTS_DIR, "baseline.json"),
+                        help="baseline to compare against, if it exists")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    results = run(args)
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            results["comparison"] = compare(results, json.load(f), args.tolerance)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S.json"))
+    for path in [output] + ([args.baseline] if args.save_baseline else []):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"results written to {output}", file=sys.stderr)
+
+    regressions = results.get("comparison", {}).get("regressions")
+    if regressions:
+        print(f"regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Optional, Set
+
+
+class Subscriber:
+    """A single consumer with its own bounded send queue."""
+
+    def __init__(self, maxsize: int = 8):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, item: Any):
+        """Enqueue without blocking, dropping the oldest item when full"""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(item)
+
+    async def get(self) -> Any:
+        return await self.queue.get()
+
+
+class Broadcaster:
+    """Fan-out registry: one producer publishes, every subscriber receives.
+
+    Each subscriber owns a bounded queue so a slow socket only ever loses its
+    own stale frames and never holds back the producer or other clients.
+    """
+
+    def __init__(self, queue_size: int = 8):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self.latest: Optional[Any] = None
+        self.published = 0
+        self.dropped = 0  # frames dropped across all subscribers
+
+    def subscribe(self) -> Subscriber:
+        sub = Subscriber(self.queue_size)
+        if self.latest is not None:
+            sub.offer(self.latest)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def publish(self, item: Any):
+        self.latest = item
+        self.published += 1
+        for sub in self._subscribers:
+            if sub.queue.full():
+                self.dropped += 1
+            sub.offer(item)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
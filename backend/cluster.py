@@ -0,0 +1,410 @@
+import asyncio
+import contextlib
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import structlog
+import uvicorn
+from starlette.routing import Match
+
+try:
+    import fcntl
+except ImportError:  # multi-worker mode needs POSIX file locks
+    fcntl = None
+
+from history_store import DEVICE_STATUSES
+from ring_buffer import RingBuffer
+from synthetic import READING_STATUS
+from ws_protocol import WS_FIELDS
+
+logger = structlog.get_logger()
+
+# magic, capacity, width, rows ever appended
+_RING_MAGIC = 0x474E4952  # "RING"
+_RING_HEADER = 4
+
+# Reading fields carried by the tick log; "status" follows from device_status
+TICK_FIELDS = tuple(f for f in WS_FIELDS if f != "status")
+
+# Headers that describe one connection and must not be forwarded
+_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "trailer", "upgrade",
+                "proxy-authorization", "proxy-authenticate", "host", "origin"}
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive flock on `path` (created if missing)"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+class SharedRingBuffer(RingBuffer):
+    """RingBuffer whose rows and count live in a memory-mapped file.
+
+    Every process that opens the same path sees the same rows. Only one
+    process may append, and rows are written before the count, so readers
+    never see a row that is only half written. A file with a different
+    capacity or width is replaced; otherwise the contents survive restarts.
+    """
+
+    def __init__(self, path: str, capacity: int, width: int):
+        if capacity <= 0 or width <= 0:
+            raise ValueError("capacity and width must be positive")
+        if fcntl is None:
+            raise RuntimeError("shared ring buffers need fcntl (POSIX)")
+        self.path = path
+        self.capacity = capacity
+        self.width = width
+        with _file_lock(path + ".lock"):
+            if not self._matches(path, capacity, width):
+                tmp = f"{path}.tmp-{os.getpid()}"
+                header = np.memmap(tmp, dtype=np.int64, mode="w+",
+                                   shape=(_RING_HEADER + 2 * capacity * width,))
+                header[:_RING_HEADER] = (_RING_MAGIC, capacity, width, 0)
+                header.flush()
+                del header
+                os.replace(tmp, path)
+            self._header = np.memmap(path, dtype=np.int64, mode="r+", shape=(_RING_HEADER,))
+            self._data = np.memmap(path, dtype=np.float64, mode="r+", offset=_RING_HEADER * 8,
+                                   shape=(2 * capacity, width))
+
+    @staticmethod
+    def _matches(path: str, capacity: int, width: int) -> bool:
+        try:
+            header = np.fromfile(path, dtype=np.int64, count=_RING_HEADER)
+            size = os.path.getsize(path)
+        except (OSError, ValueError):
+            return False
+        expected = (_RING_HEADER + 2 * capacity * width) * 8
+        return (len(header) == _RING_HEADER and size == expected
+                and tuple(header[:3]) == (_RING_MAGIC, capacity, width))
+
+    @property
+    def _count(self) -> int:
+        return int(self._header[3])
+
+    @_count.setter
+    def _count(self, value: int):
+        self._header[3] = value
+
+    def rows_since(self, after: int) -> Tuple[int, np.ndarray]:
+        """Copy of the rows appended after the first `after`, as (first row number, rows).
+
+        The oldest slot may be mid-overwrite, so at most capacity - 1 rows
+        are returned; rows overwritten before the copy finished are dropped
+        from the front.
+        """
+        count = self._count
+        start = max(min(after, count), count - self.capacity + 1)
+        if start >= count:
+            return count, np.empty((0, self.width))
+        end = (count - 1) % self.capacity + self.capacity + 1
+        rows = np.array(self._data[end - (count - start):end])
+        overwritten = self._count - self.capacity + 1 - start
+        if overwritten > 0:
+            return start + overwritten, rows[overwritten:]
+        return start, rows
+
+
+class TickLog:
+    """The readings the leader produced, in a SharedRingBuffer every worker reads.
+
+    Each reading is one fixed-width float row: when it was produced, the
+    /ws fields (device_status as its index in DEVICE_STATUSES, missing
+    values as NaN) and the device_id as an index into `device_names`.
+    Decoding rebuilds the dict the leader published, key order included,
+    so every worker serializes identical frames.
+    """
+
+    def __init__(self, path: str, capacity: int = 1024, device_names: Optional[List[str]] = None):
+        self.rows = SharedRingBuffer(path, capacity, len(TICK_FIELDS) + 2)
+        self.device_names = list(device_names or [])
+        self._device_index = {name: i for i, name in enumerate(self.device_names)}
+        self._row = np.zeros(self.rows.width)
+
+    @property
+    def count(self) -> int:
+        return self.rows.total_appended
+
+    def publish(self, data: Dict, produced_at: float) -> int:
+        """Append a reading and return its sequence number (1-based)"""
+        row = self._row
+        row[0] = produced_at
+        for i, field in enumerate(TICK_FIELDS, 1):
+            value = data.get(field)
+            if field == "device_status":
+                value = DEVICE_STATUSES.index(value) if value in DEVICE_STATUSES else -1
+            elif field == "is_anomaly":
+                value = 1.0 if value else 0.0
+            row[i] = math.nan if value is None else value
+        row[-1] = self._device_index.get(data.get("device_id"), -1)
+        self.rows.append(row)
+        return self.count
+
+    def _decode(self, row: List[float]) -> Dict:
+        data = {}
+        device = int(row[-1])
+        for field, value in zip(TICK_FIELDS, row[1:]):
+            if field == "device_status":
+                status = DEVICE_STATUSES[int(value)] if 0 <= value < len(DEVICE_STATUSES) else None
+                data["device_status"] = status
+                data["status"] = READING_STATUS.get(status)
+                # Replayed readings carry their device right after the status
+                if 0 <= device < len(self.device_names):
+                    data["device_id"] = self.device_names[device]
+            elif field == "is_anomaly":
+                data[field] = value == 1.0
+            else:
+                data[field] = None if value != value else value
+        return data
+
+    def read(self, after: int) -> List[Tuple[int, Dict, float]]:
+        """(seq, reading, produced_at) of every reading after sequence number `after`"""
+        first, rows = self.rows.rows_since(after)
+        return [(first + i + 1, self._decode(row), row[0]) for i, row in enumerate(rows.tolist())]
+
+    def latest(self) -> Optional[Dict]:
+        entries = self.read(self.count - 1)
+        return entries[-1][1] if entries else None
+
+
+class LeaderLock:
+    """Leader election with a non-blocking flock.
+
+    The kernel drops the lock when its holder exits or crashes, so the
+    next worker to try becomes the leader.
+    """
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("leader election needs fcntl (POSIX)")
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def holder(self) -> Optional[int]:
+        """pid recorded by the current leader, if any"""
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SharedSettings:
+    """Runtime settings in a versioned JSON file that every worker polls.
+
+    update() merges changes under a flock, so concurrent writers never
+    lose each other's keys; changed() returns the full settings whenever
+    the version moved since this process last looked.
+    """
+
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("shared settings need fcntl (POSIX)")
+        self.path = path
+        self._seen: Optional[int] = None
+
+    def read(self) -> Tuple[int, Dict]:
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            return int(stored["version"]), dict(stored["settings"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0, {}
+
+    def update(self, changes: Dict) -> int:
+        with _file_lock(self.path + ".lock"):
+            version, settings = self.read()
+            settings.update(changes)
+            version += 1
+            tmp = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp, "w") as f:
+                json.dump({"version": version, "settings": settings}, f)
+            os.replace(tmp, self.path)
+        self._seen = version
+        return version
+
+    def changed(self) -> Optional[Dict]:
+        version, settings = self.read()
+        if version == self._seen:
+            return None
+        self._seen = version
+        return settings if version else None
+
+
+class _InternalServer(uvicorn.Server):
+    """uvicorn server that leaves signal handling to the worker's main server"""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+    def install_signal_handlers(self):  # uvicorn < 0.29
+        pass
+
+
+class Cluster:
+    """State shared by the workers of one deployment, under `path`.
+
+    One worker holds the leader lock. It produces readings into the tick
+    log, owns the training buffer, history and models, and serves
+    forwarded requests on a Unix socket. The other workers relay the tick
+    log to their own /ws clients and forward everything stateful to it.
+    """
+
+    def __init__(self, path: str, tick_capacity: int = 1024, device_names: Optional[List[str]] = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.lock = LeaderLock(os.path.join(path, "leader.lock"))
+        self.ticks = TickLog(os.path.join(path, "ticks.ring"), tick_capacity, device_names)
+        self.settings = SharedSettings(os.path.join(path, "settings.json"))
+        self.socket_path = os.path.join(path, "leader.sock")
+        self._server: Optional[_InternalServer] = None
+        self._server_task = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lock.held
+
+    def training_buffer(self, capacity: int, width: int) -> SharedRingBuffer:
+        return SharedRingBuffer(os.path.join(self.path, "training_data.ring"), capacity, width)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled client for the leader's Unix socket"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=self.socket_path),
+                base_url="http://leader",
+                timeout=httpx.Timeout(None, connect=5.0),
+            )
+        return self._client
+
+    async def serve_leader(self, app):
+        """Start answering forwarded requests (leader only)"""
+        if self._server is not None:
+            return
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        # log_config=None keeps the worker's logging configuration as it is
+        config = uvicorn.Config(app, uds=self.socket_path, lifespan="off", log_config=None, access_log=False)
+        self._server = _InternalServer(config)
+        self._server_task = asyncio.get_running_loop().create_task(self._server.serve())
+
+    async def aclose(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            await self._server_task
+            self._server = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.lock.release()
+
+    def stats(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "leader": self.is_leader,
+            "leader_pid": self.lock.holder(),
+            "ticks": self.ticks.count,
+        }
+
+
+class LeaderProxy:
+    """ASGI middleware that forwards HTTP requests from followers to the leader.
+
+    Requests for `local_routes` (route templates) and requests handled by
+    the leader itself go to the app as usual. Anything else that matches
+    a route is streamed to the leader's Unix socket, body and response
+    included. The matched route is still recorded in the scope, so
+    per-route metrics keep their labels.
+    """
+
+    def __init__(self, app, cluster: Cluster, local_routes: Iterable[str]):
+        self.app = app
+        self.cluster = cluster
+        self.local_routes = set(local_routes)
+
+    def _route(self, scope):
+        for route in scope["app"].router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return route, child_scope
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.cluster.is_leader:
+            await self.app(scope, receive, send)
+            return
+        route, child_scope = self._route(scope)
+        if route is None or route.path in self.local_routes:
+            await self.app(scope, receive, send)
+            return
+        scope.update(child_scope)
+        await self._forward(scope, receive, send)
+
+    async def _forward(self, scope, receive, send):
+        async def body():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                if message.get("body"):
+                    yield message["body"]
+                if not message.get("more_body"):
+                    return
+
+        url = scope["path"] + (f"?{scope['query_string'].decode()}" if scope["query_string"] else "")
+        headers = [(k, v) for k, v in scope["headers"] if k.decode().lower() not in _HOP_HEADERS]
+        client = self.cluster.client
+        try:
+            request = client.build_request(scope["method"], url, headers=headers, content=body())
+            response = await client.send(request, stream=True)
+        except httpx.TransportError as e:
+            logger.warning("leader_unreachable", error=str(e))
+            payload = json.dumps({"error": "leader unavailable, retry shortly"}).encode()
+            await send({"type": "http.response.start", "status": 503, "headers": [
+                (b"content-type", b"application/json"), (b"retry-after", b"1"),
+                (b"content-length", str(len(payload)).encode())]})
+            await send({"type": "http.response.body", "body": payload})
+            return
+        try:
+            await send({"type": "http.response.start", "status": response.status_code, "headers": [
+                (k, v) for k, v in response.headers.raw if k.decode().lower() not in _HOP_HEADERS]})
+            async for chunk in response.aiter_raw():
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await response.aclose()
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most `n_out` points of (x, y) that preserve the
+    visual shape of the series. The first and last points are always kept;
+    NaN values in `y` are dropped before bucketing.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n_out >= n or n_out < 3:
+        return valid if n_out >= n else valid[np.linspace(0, n - 1, max(n_out, 0)).astype(int)]
+    xs = x[valid].astype(np.float64)
+    ys = y[valid].astype(np.float64)
+
+    # Bucket edges over the interior points (first and last are fixed)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Mean of every bucket up front, used as the third triangle vertex
+    sums_x = np.add.reduceat(xs[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(ys[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    mean_x = np.append(sums_x / sizes, xs[-1])
+    mean_y = np.append(sums_y / sizes, ys[-1])
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = xs[a], ys[a]
+        cx, cy = mean_x[i + 1], mean_y[i + 1]
+        # Twice the triangle area for every candidate point in the bucket
+        area = np.abs((ax - cx) * (ys[lo:hi] - ay) - (ax - xs[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return valid[selected]
@@ -0,0 +1,405 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Fixed-width column layout of every stored reading
+HISTORY_FIELDS = {
+    "timestamp": np.float64,
+    "temperature": np.float64,
+    "humidity": np.float64,
+    "cpu_usage": np.float64,
+    "memory_usage": np.float64,
+    "network_speed": np.float64,
+    "signal_strength": np.float64,
+    "device_status": np.int8,
+    "is_anomaly": np.int8,
+    "anomaly_score": np.float64,
+    "temperature_prediction": np.float64,
+    "humidity_prediction": np.float64,
+}
+
+# device_status is stored as an index into this tuple (-1 when unknown)
+DEVICE_STATUSES = ("online", "warning", "offline")
+_STATUS_CODES = {name: code for code, name in enumerate(DEVICE_STATUSES)}
+
+# Every INDEX_STRIDE-th timestamp of a segment is kept in memory for range seeks
+INDEX_STRIDE = 1024
+
+
+def encode_records(records: List[Dict]) -> Dict[str, np.ndarray]:
+    """Convert reading dicts (as produced by the pipeline) to storage columns"""
+    columns = {}
+    for field, dtype in HISTORY_FIELDS.items():
+        if field == "device_status":
+            values = [_STATUS_CODES.get(r.get(field), -1) for r in records]
+        elif field == "is_anomaly":
+            values = [1 if r.get(field) else 0 for r in records]
+        else:
+            values = [np.nan if r.get(field) is None else r[field] for r in records]
+        columns[field] = np.array(values, dtype=dtype)
+    return columns
+
+
+def decode_column(field: str, values: np.ndarray) -> list:
+    """Convert a stored column to JSON-friendly values"""
+    if field == "device_status":
+        return [DEVICE_STATUSES[v] if 0 <= v < len(DEVICE_STATUSES) else None for v in values.tolist()]
+    if field == "is_anomaly":
+        return [bool(v) for v in values.tolist()]
+    return [None if v != v else v for v in values.tolist()]
+
+
+class Segment:
+    """A fixed-capacity block of rows stored as one memory-mapped file per column."""
+
+    def __init__(self, path: str, start_row: int, capacity: int):
+        self.path = path
+        self.start_row = start_row
+        self.capacity = capacity
+        self.count = 0
+        self.min_ts = np.inf
+        self.max_ts = -np.inf
+        self.sorted = True  # timestamps non-decreasing, so binary search is valid
+        self._columns: Optional[Dict[str, np.memmap]] = None
+        self._index: Optional[np.ndarray] = None
+
+    @classmethod
+    def create(cls, path: str, start_row: int, capacity: int) -> "Segment":
+        os.makedirs(path, exist_ok=True)
+        segment = cls(path, start_row, capacity)
+        columns = {}
+        for field, dtype in HISTORY_FIELDS.items():
+            columns[field] = np.memmap(segment._file(field), dtype=dtype, mode="w+", shape=(capacity,))
+        # Unwritten rows are NaN so the row count can be recovered after a crash
+        columns["timestamp"][:] = np.nan
+        segment._columns = columns
+        segment._index = np.empty(0)
+        return segment
+
+    @classmethod
+    def open(cls, path: str, start_row: int, capacity: int) -> "Segment":
+        segment = cls(path, start_row, capacity)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            segment.count = meta["count"]
+            segment.min_ts = meta["min_ts"]
+            segment.max_ts = meta["max_ts"]
+            segment.sorted = meta["sorted"]
+        else:
+            # Unsealed segment: rows are written in order, so the first NaN ends the data
+            ts = segment.columns()["timestamp"]
+            unwritten = np.flatnonzero(np.isnan(ts))
+            segment.count = int(unwritten[0]) if len(unwritten) else capacity
+            if segment.count:
+                written = ts[:segment.count]
+                segment.min_ts = float(written.min())
+                segment.max_ts = float(written.max())
+                segment.sorted = bool(np.all(written[1:] >= written[:-1]))
+        return segment
+
+    def _file(self, field: str) -> str:
+        return os.path.join(self.path, f"{field}.col")
+
+    @property
+    def is_open(self) -> bool:
+        return self._columns is not None
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def columns(self) -> Dict[str, np.memmap]:
+        if self._columns is None:
+            self._columns = {
+                field: np.memmap(self._file(field), dtype=dtype, mode="r+", shape=(self.capacity,))
+                for field, dtype in HISTORY_FIELDS.items()
+            }
+        return self._columns
+
+    def sparse_index(self) -> np.ndarray:
+        if self._index is None:
+            self._index = np.array(self.columns()["timestamp"][:self.count:INDEX_STRIDE])
+        return self._index
+
+    def append(self, columns: Dict[str, np.ndarray]) -> int:
+        """Write as many rows as fit; returns the number written"""
+        n = min(len(columns["timestamp"]), self.capacity - self.count)
+        if n <= 0:
+            return 0
+        target = self.columns()
+        lo, hi = self.count, self.count + n
+        for field in HISTORY_FIELDS:
+            target[field][lo:hi] = columns[field][:n]
+
+        ts = columns["timestamp"][:n]
+        if self.sorted and (ts[0] < self.max_ts or np.any(ts[1:] < ts[:-1])):
+            self.sorted = False
+        self.min_ts = min(self.min_ts, float(ts.min()))
+        self.max_ts = max(self.max_ts, float(ts.max()))
+
+        # Extend the sparse index with the strided rows that were just written
+        first = -(-lo // INDEX_STRIDE) * INDEX_STRIDE
+        if first < hi and self._index is not None:
+            self._index = np.concatenate([self._index, target["timestamp"][first:hi:INDEX_STRIDE]])
+        self.count = hi
+        return n
+
+    def locate(self, t_from: float, t_to: float) -> np.ndarray:
+        """Return the local row positions with t_from <= timestamp <= t_to"""
+        if not self.sorted:
+            ts = self.columns()["timestamp"][:self.count]
+            return np.flatnonzero((ts >= t_from) & (ts <= t_to))
+        return np.arange(*self.bounds(t_from, t_to))
+
+    def count_range(self, t_from: float, t_to: float) -> int:
+        if not self.sorted:
+            return len(self.locate(t_from, t_to))
+        lo, hi = self.bounds(t_from, t_to)
+        return hi - lo
+
+    def bounds(self, t_from: float, t_to: float) -> Tuple[int, int]:
+        """Local [lo, hi) rows within the time range; only valid for sorted segments"""
+        ts = self.columns()["timestamp"]
+        # Narrow to whole index blocks first so only the touched pages are read
+        index = self.sparse_index()
+        block_lo = max(0, int(np.searchsorted(index, t_from, side="left")) - 1) * INDEX_STRIDE
+        block_hi = min(self.count, int(np.searchsorted(index, t_to, side="right")) * INDEX_STRIDE)
+        window = ts[block_lo:block_hi]
+        lo = block_lo + int(np.searchsorted(window, t_from, side="left"))
+        hi = block_lo + int(np.searchsorted(window, t_to, side="right"))
+        return lo, max(lo, hi)
+
+    def seal(self):
+        """Persist summary metadata so the segment reopens without a scan"""
+        self.flush()
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"count": self.count, "min_ts": self.min_ts, "max_ts": self.max_ts,
+                       "sorted": self.sorted}, f)
+
+    def flush(self):
+        if self._columns is not None:
+            for column in self._columns.values():
+                column.flush()
+
+    def close(self):
+        self.flush()
+        self._columns = None
+
+
+class HistoryStore:
+    """Append-only, segment-based columnar store for readings and ML results.
+
+    Each segment holds `segment_rows` rows in one memory-mapped file per
+    field. Range queries pick overlapping segments by their min/max
+    timestamps, seek with a sparse in-memory timestamp index and slice only
+    the requested columns, so nothing outside the range is paged in. The
+    global row ids of anomalous readings go to an append-only log, which
+    makes "recent anomalies" a tail read rather than a scan.
+    """
+
+    def __init__(self, path: str, segment_rows: int = 86400, max_open_segments: int = 16):
+        self.path = path
+        self.max_open_segments = max_open_segments
+        os.makedirs(path, exist_ok=True)
+
+        config_path = os.path.join(path, "store.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                segment_rows = json.load(f)["segment_rows"]
+        else:
+            with open(config_path, "w") as f:
+                json.dump({"segment_rows": segment_rows, "fields": list(HISTORY_FIELDS)}, f)
+        self.segment_rows = segment_rows
+
+        self.segments: List[Segment] = []
+        for name in sorted(os.listdir(path)):
+            if name.startswith("seg_"):
+                start_row = int(name[4:])
+                self.segments.append(Segment.open(os.path.join(path, name), start_row, segment_rows))
+        self._starts = [s.start_row for s in self.segments]
+        self._open: "OrderedDict[int, Segment]" = OrderedDict()
+        for segment in self.segments:
+            if segment.is_open:
+                self._touch(segment)
+
+        self._anomaly_path = os.path.join(path, "anomalies.i8")
+        self._anomaly_log = open(self._anomaly_path, "ab")
+
+    def __len__(self) -> int:
+        if not self.segments:
+            return 0
+        return self.segments[-1].start_row + self.segments[-1].count
+
+    def _touch(self, segment: Segment):
+        """Mark a segment as recently used and close the least recently used ones"""
+        self._open[segment.start_row] = segment
+        self._open.move_to_end(segment.start_row)
+        active = self.segments[-1] if self.segments else None
+        while len(self._open) > self.max_open_segments:
+            _, oldest = self._open.popitem(last=False)
+            if oldest is active:
+                self._open[oldest.start_row] = oldest
+                continue
+            oldest.close()
+
+    def _active_segment(self) -> Segment:
+        if not self.segments or self.segments[-1].full:
+            if self.segments:
+                self.segments[-1].seal()
+            start_row = len(self)
+            segment = Segment.create(os.path.join(self.path, f"seg_{start_row:012d}"),
+                                     start_row, self.segment_rows)
+            self.segments.append(segment)
+            self._starts.append(start_row)
+        segment = self.segments[-1]
+        self._touch(segment)
+        return segment
+
+    def append(self, record: Dict):
+        self.append_batch(encode_records([record]))
+
+    def append_batch(self, columns: Dict[str, np.ndarray]):
+        """Append rows given as storage columns (see encode_records)"""
+        total = len(columns["timestamp"])
+        offset = 0
+        while offset < total:
+            segment = self._active_segment()
+            first_row = segment.start_row + segment.count
+            chunk = {field: values[offset:] for field, values in columns.items()}
+            written = segment.append(chunk)
+            anomalous = np.flatnonzero(chunk["is_anomaly"][:written])
+            if len(anomalous):
+                self._anomaly_log.write((anomalous + first_row).astype(np.int64).tobytes())
+            offset += written
+        self._anomaly_log.flush()
+
+    def _overlapping(self, t_from: float, t_to: float) -> Iterable[Segment]:
+        for segment in self.segments:
+            if segment.count and segment.max_ts >= t_from and segment.min_ts <= t_to:
+                self._touch(segment)
+                yield segment
+
+    def query(self, t_from: float, t_to: float, fields: Optional[List[str]] = None,
+              limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Return the requested columns for rows with t_from <= timestamp <= t_to.
+
+        With `limit`, only the most recent `limit` rows of the range are returned.
+        """
+        fields = list(fields or HISTORY_FIELDS)
+        unknown = [f for f in fields if f not in HISTORY_FIELDS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+
+        parts: List[Tuple[Segment, np.ndarray]] = []
+        for segment in self._overlapping(t_from, t_to):
+            rows = segment.locate(t_from, t_to)
+            if len(rows):
+                parts.append((segment, rows))
+        if limit is not None:
+            parts = self._keep_last(parts, limit)
+
+        result = {}
+        for field in fields:
+            chunks = [self._take(segment.columns()[field], rows) for segment, rows in parts]
+            result[field] = np.concatenate(chunks) if chunks else np.empty(0, dtype=HISTORY_FIELDS[field])
+        return result
+
+    def count(self, t_from: float, t_to: float) -> int:
+        """Number of stored rows with t_from <= timestamp <= t_to"""
+        return sum(segment.count_range(t_from, t_to) for segment in self._overlapping(t_from, t_to))
+
+    @staticmethod
+    def _keep_last(parts: List[Tuple[Segment, np.ndarray]], limit: int) -> List[Tuple[Segment, np.ndarray]]:
+        kept = []
+        for segment, rows in reversed(parts):
+            if limit <= 0:
+                break
+            kept.append((segment, rows[-limit:]))
+            limit -= len(rows)
+        return kept[::-1]
+
+    @staticmethod
+    def _take(column: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        # Contiguous row runs are sliced rather than fancy-indexed
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            return np.array(column[rows[0]:rows[-1] + 1])
+        return column[rows]
+
+    def _rows_by_id(self, row_ids: np.ndarray, fields: List[str]) -> Dict[str, np.ndarray]:
+        result = {field: np.empty(len(row_ids), dtype=HISTORY_FIELDS[field]) for field in fields}
+        seg_idx = np.searchsorted(self._starts, row_ids, side="right") - 1
+        for i in np.unique(seg_idx):
+            segment = self.segments[i]
+            self._touch(segment)
+            mask = seg_idx == i
+            local = row_ids[mask] - segment.start_row
+            for field in fields:
+                result[field][mask] = segment.columns()[field][local]
+        return result
+
+    def anomalies(self, limit: int = 10, t_from: Optional[float] = None,
+                  t_to: Optional[float] = None) -> List[Dict]:
+        """Return the most recent anomalous readings, newest first"""
+        self._anomaly_log.flush()
+        size = os.path.getsize(self._anomaly_path) // 8
+        if size == 0 or limit <= 0:
+            return []
+        ids = np.memmap(self._anomaly_path, dtype=np.int64, mode="r", shape=(size,))
+
+        if t_from is None and t_to is None:
+            selected = np.array(ids[-limit:])
+        else:
+            t_from = -np.inf if t_from is None else t_from
+            t_to = np.inf if t_to is None else t_to
+            lo_row, hi_row = self._row_bounds(t_from, t_to)
+            lo = int(np.searchsorted(ids, lo_row, side="left"))
+            hi = int(np.searchsorted(ids, hi_row, side="left"))
+            # Walk back from the newest id in the range, reading timestamps only;
+            # unsorted segments only bound the search by row, so filter by time here
+            kept, found, end, chunk = [], 0, hi, max(limit, 256)
+            while end > lo and found < limit:
+                start = max(lo, end - chunk)
+                block = np.array(ids[start:end])
+                ts = self._rows_by_id(block, ["timestamp"])["timestamp"]
+                block = block[(ts >= t_from) & (ts <= t_to)]
+                kept.append(block)
+                found += len(block)
+                end = start
+                chunk *= 2
+            selected = np.concatenate(kept[::-1])[-limit:] if kept else np.empty(0, dtype=np.int64)
+        del ids
+
+        records = self._rows_by_id(selected, list(HISTORY_FIELDS))
+        decoded = {field: decode_column(field, values) for field, values in records.items()}
+        count = len(records["timestamp"])
+        return [{field: decoded[field][i] for field in decoded} for i in range(count - 1, -1, -1)]
+
+    def _row_bounds(self, t_from: float, t_to: float) -> Tuple[int, int]:
+        """Global [lo, hi) row range that contains every row in the time range"""
+        lo, hi = None, None
+        for segment in self._overlapping(t_from, t_to):
+            if segment.sorted:
+                seg_lo, seg_hi = segment.bounds(t_from, t_to)
+                if seg_lo == seg_hi:
+                    continue
+            else:
+                seg_lo, seg_hi = 0, segment.count
+            lo = segment.start_row + seg_lo if lo is None else lo
+            hi = segment.start_row + seg_hi
+        return (lo, hi) if lo is not None else (0, 0)
+
+    def flush(self):
+        for segment in self._open.values():
+            segment.flush()
+        self._anomaly_log.flush()
+
+    def close(self):
+        for segment in self._open.values():
+            segment.close()
+        self._open.clear()
+        self._anomaly_log.close()
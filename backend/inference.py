@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ml_models import SensorDataML
+
+
+class InferenceBatcher:
+    """Micro-batching front end for SensorDataML.add_data_point.
+
+    Concurrent callers are queued and flushed together once `max_batch`
+    readings are waiting or `max_delay` seconds have passed since the first
+    one arrived, whichever comes first. Each flush is a single
+    add_data_points call, so the per-call sklearn overhead is paid once per
+    group instead of once per caller.
+    """
+
+    def __init__(self, model: SensorDataML, max_batch: int = 64, max_delay: float = 0.002,
+                 latency_window: int = 2048):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Dict, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self._batch_sizes = deque(maxlen=latency_window)
+        self._latencies = deque(maxlen=latency_window)
+
+    async def submit(self, data: Dict) -> Dict:
+        """Queue one reading and wait for its ML analysis"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((data, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self):
+        """Run everything queued so far as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        try:
+            results = self.model.add_data_points([data for data, _, _ in batch])
+        except ValueError:
+            # A reading failed validation, which happens before anything is
+            # added: run them one at a time so only the bad one fails
+            results = [self._add_one(data, future) for data, future, _ in batch]
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        done = time.perf_counter()
+        for (_, future, queued_at), result in zip(batch, results):
+            if result is None:
+                continue
+            if not future.done():
+                future.set_result(result)
+            self._latencies.append(done - queued_at)
+
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self._batch_sizes.append(len(batch))
+
+    def _add_one(self, data: Dict, future: asyncio.Future) -> Optional[Dict]:
+        try:
+            return self.model.add_data_points([data])[0]
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict:
+        latencies = np.array(self._latencies) * 1000
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+        return {
+            "queue_depth": self.queue_depth,
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": float(np.mean(self._batch_sizes)) if self._batch_sizes else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "latency_p50_ms": float(p50),
+            "latency_p99_ms": float(p99),
+        }
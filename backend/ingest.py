@@ -0,0 +1,156 @@
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from history_store import DEVICE_STATUSES, HISTORY_FIELDS
+from ml_models import FEATURE_INPUTS
+
+# Fields every ingested reading must carry as finite numbers
+REQUIRED_FIELDS = ("timestamp",) + FEATURE_INPUTS
+
+# Compact binary framing: consecutive little-endian float64 records in this order.
+# signal_strength may be NaN when a device does not report it.
+BINARY_FIELDS = ("timestamp",) + FEATURE_INPUTS + ("signal_strength",)
+BINARY_RECORD = np.dtype([(name, "<f8") for name in BINARY_FIELDS])
+
+
+def status_codes_from_signal(signal_strength: np.ndarray) -> np.ndarray:
+    """Vectorized signal strength -> device_status code (see DEVICE_STATUSES)"""
+    return np.select(
+        [signal_strength >= 70, signal_strength >= 40, signal_strength >= 0],
+        [0, 1, 2],
+        default=-1,
+    ).astype(np.int8)
+
+
+class NdjsonDecoder:
+    """Split an NDJSON byte stream into complete lines, chunk by chunk."""
+
+    def __init__(self):
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        data = self._tail + chunk
+        lines = data.split(b"\n")
+        self._tail = lines.pop()
+        return [line for line in lines if line.strip()]
+
+    def close(self) -> List[bytes]:
+        tail, self._tail = self._tail, b""
+        return [tail] if tail.strip() else []
+
+
+class BinaryDecoder:
+    """Split a binary record stream into structured arrays, chunk by chunk."""
+
+    def __init__(self):
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> np.ndarray:
+        data = self._tail + chunk
+        usable = len(data) - len(data) % BINARY_RECORD.itemsize
+        self._tail = data[usable:]
+        return np.frombuffer(data[:usable], dtype=BINARY_RECORD)
+
+    def close(self) -> int:
+        """Return the number of trailing bytes that did not form a whole record"""
+        leftover, self._tail = len(self._tail), b""
+        return leftover
+
+
+def _column(records: List[Dict], field: str) -> np.ndarray:
+    values = [r.get(field) if isinstance(r, dict) else None for r in records]
+    try:
+        return np.array(values, dtype=np.float64)  # None becomes NaN
+    except (TypeError, ValueError):
+        # Slow path for the odd malformed value: mark it NaN, keep the rest
+        out = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+def parse_ndjson_lines(lines: List[bytes]) -> Tuple[Dict[str, np.ndarray], List[Dict], int]:
+    """Decode and validate NDJSON lines.
+
+    Returns the valid rows as float64 columns, the matching reading dicts
+    (for optional fields such as device_id) and the number of rejected lines.
+    A device_id that is present must be a string.
+    """
+    try:
+        # One decoder call for the whole batch is far cheaper than one per line
+        records = json.loads(b"[" + b",".join(lines) + b"]")
+        if len(records) != len(lines):
+            raise ValueError("a line held more than one JSON value")
+    except ValueError:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+
+    columns = {field: _column(records, field) for field in REQUIRED_FIELDS + ("signal_strength",)}
+    valid = np.ones(len(records), dtype=bool)
+    for field in REQUIRED_FIELDS:
+        valid &= np.isfinite(columns[field])
+    valid &= np.array([not isinstance(r, dict) or isinstance(r.get("device_id"), (str, type(None)))
+                       for r in records], dtype=bool)
+    rejected = int(len(records) - np.count_nonzero(valid))
+    if rejected:
+        columns = {field: values[valid] for field, values in columns.items()}
+        records = [r for r, ok in zip(records, valid.tolist()) if ok]
+
+    statuses = [r.get("device_status") for r in records]
+    if any(s is not None for s in statuses):
+        derived = status_codes_from_signal(columns["signal_strength"])
+        codes = {name: code for code, name in enumerate(DEVICE_STATUSES)}
+        columns["device_status"] = np.array(
+            # Statuses that are not a known name fall back to the signal-derived code
+            [codes.get(s, d) if isinstance(s, str) else d for s, d in zip(statuses, derived.tolist())],
+            dtype=np.int8)
+    else:
+        columns["device_status"] = status_codes_from_signal(columns["signal_strength"])
+    return columns, records, rejected
+
+
+def parse_binary_records(records: np.ndarray) -> Tuple[Dict[str, np.ndarray], int]:
+    """Validate binary records; returns valid rows as columns and the rejected count"""
+    valid = np.ones(len(records), dtype=bool)
+    for field in REQUIRED_FIELDS:
+        valid &= np.isfinite(records[field])
+    rejected = int(len(records) - np.count_nonzero(valid))
+    records = records[valid]
+    columns = {field: np.ascontiguousarray(records[field]) for field in BINARY_FIELDS}
+    columns["device_status"] = status_codes_from_signal(columns["signal_strength"])
+    return columns, rejected
+
+
+def device_groups(records: List[Dict]) -> Dict[Optional[str], np.ndarray]:
+    """Row indices per device_id; readings without one are grouped under None"""
+    groups: Dict[Optional[str], List[int]] = {}
+    for i, record in enumerate(records):
+        groups.setdefault(record.get("device_id"), []).append(i)
+    return {device: np.asarray(rows) for device, rows in groups.items()}
+
+
+def storage_columns(columns: Dict[str, np.ndarray], scored: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Combine validated reading columns and ML results into HistoryStore columns"""
+    n = len(columns["timestamp"])
+    out = {}
+    for field, dtype in HISTORY_FIELDS.items():
+        source = columns if field in columns else scored
+        if field in source:
+            out[field] = source[field].astype(dtype, copy=False)
+        else:
+            out[field] = np.full(n, np.nan, dtype=dtype)
+    return out
+
+
+def batched(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
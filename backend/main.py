@@ -1,24 +1,313 @@
-from fastapi import FastAPI, WebSocket, Request
+from fastapi import FastAPI, WebSocket, Request, Query
 from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 import asyncio
+import json
 import math
 import os
 import random
 import time
+from contextlib import asynccontextmanager
 
-import httpx
-import psutil
+import numpy as np
 import structlog
 
-from ml_models import SensorDataML
+from broadcast import Broadcaster
+from cluster import Cluster, LeaderProxy
+from downsample import lttb
+from history_store import HistoryStore, decode_column
+from ingest import (BinaryDecoder, NdjsonDecoder, batched, device_groups, parse_binary_records,
+                    parse_ndjson_lines, storage_columns)
+from inference import InferenceBatcher
+from metrics import REGISTRY, Counter, Gauge, Histogram, MetricsMiddleware
+from ml_models import ANOMALY_ENGINES, FORECAST_ENGINES, N_FEATURES, SensorDataML, readings_to_columns
+from model_registry import ModelRegistry
+from rollups import ROLLUP_FIELDS, RollupSet
+from synthetic import READING_STATUS, Replay, device_status_for, load_dataset
+from telemetry import TelemetrySampler
+from training_jobs import TrainingJobManager
+from weather import OPEN_METEO_URL, CircuitBreaker, WeatherCache
+from ws_protocol import KEYFRAME_INTERVAL, FrameCache, WsOptions
 
 logger = structlog.get_logger()
-app = FastAPI()
+
+STREAM_INTERVAL = float(os.getenv("STREAM_INTERVAL", "1.0"))  # seconds between ticks
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "8"))
+
+# System telemetry sampled by one background task; readers use the snapshot
+telemetry = TelemetrySampler(
+    interval=float(os.getenv("TELEMETRY_INTERVAL", "1.0")),
+    history_size=int(os.getenv("TELEMETRY_HISTORY", "300")),
+)
+
+# Single producer fans each tick out to every /ws client
+broadcaster = Broadcaster(queue_size=WS_SEND_QUEUE_SIZE)
+# Each tick is serialized once per negotiated /ws encoding and shared
+ws_frames = FrameCache(history=max(64, 4 * WS_SEND_QUEUE_SIZE))
+
+# Replay mode: stream a recorded dataset (synthetic.py .npz or a history
+# directory) REPLAY_SPEED times faster than recorded, instead of live readings
+REPLAY_FILE = os.getenv("REPLAY_FILE")
+REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "60"))
+REPLAY_LOOP = os.getenv("REPLAY_LOOP", "1") != "0"
+REPLAY_MAX_BATCH = 256  # readings processed per producer wakeup when behind
+replay = Replay(load_dataset(REPLAY_FILE), REPLAY_SPEED, REPLAY_LOOP) if REPLAY_FILE else None
+
+# Multi-worker mode: with SHARED_STATE_DIR set, run several workers
+# (uvicorn main:app --workers 4). The elected leader produces readings,
+# trains and answers stateful routes, which the other workers forward to
+# it; every worker streams the leader's readings from shared memory.
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR")
+CLUSTER_POLL_INTERVAL = float(os.getenv("CLUSTER_POLL_INTERVAL", "1.0"))  # election and settings, seconds
+TICK_POLL_INTERVAL = float(os.getenv("TICK_POLL_INTERVAL_MS", "10")) / 1000  # shared readings, seconds
+# Routes every worker answers itself; the rest go to the leader
+WORKER_LOCAL_ROUTES = ("/data", "/stats", "/stats/history", "/healthz", "/metrics")
+cluster = Cluster(
+    SHARED_STATE_DIR,
+    tick_capacity=4 * REPLAY_MAX_BATCH + 1024,
+    device_names=replay.device_names if replay is not None else None,
+) if SHARED_STATE_DIR else None
+
+# Newest reading the producer published (single-process mode), served by /data
+latest_reading: dict | None = None
+
+def publish_reading(data: dict, produced_at: float | None = None):
+    """Hand a reading to the /ws clients, through the shared tick log in multi-worker mode."""
+    global latest_reading
+    latest_reading = data
+    if cluster is not None:
+        cluster.ticks.publish(data, data["timestamp"] if produced_at is None else produced_at)
+    else:
+        broadcaster.publish(ws_frames.publish(data, produced_at=produced_at))
+
+async def replay_producer():
+    """Stream the recorded dataset through the live pipeline instead of generating readings.
+
+    Replayed readings keep their recorded timestamps, get ML analysis and
+    update the metrics like live ones, but are not written to the history.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    while not replay.finished:
+        readings = replay.due(loop.time() - started, limit=REPLAY_MAX_BATCH)
+        if readings:
+            try:
+                analyses = await asyncio.gather(*(inference.submit(data) for data in readings))
+                for data, analysis in zip(readings, analyses):
+                    data.update(analysis)
+                    _record_reading_metrics(data)
+                    publish_reading(data, produced_at=time.time())
+            except Exception as e:
+                logger.warning("replay_error", error=str(e))
+        await asyncio.sleep(min(replay.delay(loop.time() - started), STREAM_INTERVAL))
+    logger.info("replay_finished", **replay.stats())
+
+async def sensor_producer():
+    """Generate one reading per tick, store it and broadcast it to all subscribers.
+
+    Runs whether or not a /ws client is connected, so history, rollups,
+    metrics and online learning stay current for REST-only clients too.
+    """
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while True:
+        try:
+            publish_reading(await generate_sensor_data_async())
+        except Exception as e:
+            logger.warning("producer_error", error=str(e))
+        next_tick += STREAM_INTERVAL
+        delay = next_tick - loop.time()
+        if delay < 0:
+            # Fell behind (slow tick); resync instead of bursting.
+            next_tick = loop.time()
+            delay = 0
+        await asyncio.sleep(delay)
+
+producer: asyncio.Task | None = None
+
+async def start_pipeline():
+    """Load history, rollups and models and start producing readings.
+
+    Single-process mode runs this at startup; in multi-worker mode only the
+    worker elected leader does.
+    """
+    global producer
+    rollups.load(ROLLUPS_PATH)
+    rollups.rebuild(history, time.time())
+    # Warm start: serve the last published models and continue the saved buffer.
+    # A shared buffer that already holds samples is newer than any snapshot.
+    shared_samples = cluster is not None and len(ml_model.training_data) > 0
+    started = time.perf_counter()
+    if ml_model.load_models(restore_training_data=not shared_samples):
+        if not shared_samples:
+            ml_model.load_training_data()
+        logger.info("models_loaded", version=ml_model.models.version,
+                    seconds=round(time.perf_counter() - started, 3))
+    if shared_samples:
+        ml_model.resume_stream()
+    producer = asyncio.create_task(replay_producer() if replay is not None else sensor_producer())
+
+async def stop_pipeline():
+    training_jobs.shutdown()
+    model_registry.flush()
+    ml_model.save_training_data()
+    producer.cancel()
+    try:
+        await producer
+    except asyncio.CancelledError:
+        pass
+    rollups.save(ROLLUPS_PATH)
+
+def _reopen_history():
+    """Reopen the history store to see the segments a previous leader wrote."""
+    global history
+    history.close()
+    history = open_history()
+    ml_model.history = history
+    model_registry.model_kwargs["history"] = history
+
+async def follow_cluster():
+    """Relay the leader's readings to local /ws clients, apply shared settings
+    and take over as leader when the lock is free."""
+    loop = asyncio.get_running_loop()
+    seen = cluster.ticks.count
+    next_check = loop.time()
+    while True:
+        for seq, data, produced_at in cluster.ticks.read(seen):
+            seen = seq
+            # The leader counted its readings as it produced them
+            if not cluster.is_leader:
+                _record_reading_metrics(data)
+            if broadcaster.subscriber_count:
+                broadcaster.publish(ws_frames.publish(data, produced_at=produced_at, seq=seq))
+        if loop.time() >= next_check:
+            next_check = loop.time() + CLUSTER_POLL_INTERVAL
+            changed = cluster.settings.changed()
+            if changed:
+                try:
+                    _apply_settings(changed)
+                except ValueError as e:
+                    logger.warning("shared_settings_invalid", error=str(e))
+            if not cluster.is_leader and cluster.lock.try_acquire():
+                logger.info("leader_elected", pid=os.getpid())
+                _reopen_history()
+                await start_pipeline()
+                await cluster.serve_leader(app)
+        await asyncio.sleep(TICK_POLL_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    telemetry.start()
+    if cluster is None:
+        await start_pipeline()
+    else:
+        follower = asyncio.create_task(follow_cluster())
+    try:
+        yield
+    finally:
+        if cluster is not None:
+            follower.cancel()
+            try:
+                await follower
+            except asyncio.CancelledError:
+                pass
+        if producer is not None:
+            await stop_pipeline()
+        if cluster is not None:
+            await cluster.aclose()
+        await telemetry.stop()
+        await weather.aclose()
+        history.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# On-disk columnar history of every reading and its ML results
+def open_history() -> HistoryStore:
+    return HistoryStore(
+        os.getenv("HISTORY_DIR", "history"),
+        segment_rows=int(os.getenv("HISTORY_SEGMENT_ROWS", "86400")),
+    )
+
+history = open_history()
+
+# Incremental min/max/mean/count rollups for long-range charts
+rollups = RollupSet()
+ROLLUPS_PATH = os.path.join(history.path, "rollups.npz")
+SERIES_RAW_LIMIT = int(os.getenv("SERIES_RAW_LIMIT", "20000"))  # raw rows before switching to rollups
 
 # Initialize ML model
-ml_model = SensorDataML()
+ML_MAX_TRAINING_SAMPLES = int(os.getenv("ML_MAX_TRAINING_SAMPLES", "1000"))
+ml_model = SensorDataML(
+    model_dir=os.getenv("ML_MODEL_DIR", "models"),
+    max_training_samples=ML_MAX_TRAINING_SAMPLES,
+    window_size=int(os.getenv("ML_WINDOW_SIZE", "5")),
+    history=history,
+    keep_versions=int(os.getenv("ML_KEEP_VERSIONS", "5")),
+    forecast_engine=os.getenv("ML_FORECAST_ENGINE", "random_forest"),
+    anomaly_engine=os.getenv("ML_ANOMALY_ENGINE", "isolation_forest"),
+    # Memory-mapped in multi-worker mode, so a new leader continues where the last one stopped
+    training_buffer=cluster.training_buffer(ML_MAX_TRAINING_SAMPLES, N_FEATURES) if cluster is not None else None,
+)
+
+# Per-device models for readings that carry a device_id, loaded lazily and LRU-evicted
+ML_REGISTRY_MAX_MB = os.getenv("ML_REGISTRY_MAX_MB")
+model_registry = ModelRegistry(
+    os.getenv("ML_DEVICE_MODEL_DIR", os.path.join(ml_model.model_dir, "devices")),
+    max_models=int(os.getenv("ML_REGISTRY_MAX_MODELS", "64")),
+    max_bytes=int(float(ML_REGISTRY_MAX_MB) * 2**20) if ML_REGISTRY_MAX_MB else None,
+    max_training_samples=ml_model.max_training_samples,
+    window_size=ml_model.window_size,
+    history=history,
+    keep_versions=ml_model.keep_versions,
+    forecast_engine=ml_model.forecast_engine,
+    anomaly_engine=ml_model.anomaly_engine,
+)
+
+# Concurrent add_data_point callers are scored together in micro-batches
+inference = InferenceBatcher(
+    ml_model,
+    max_batch=int(os.getenv("ML_BATCH_MAX_SIZE", "64")),
+    max_delay=float(os.getenv("ML_BATCH_MAX_DELAY_MS", "2")) / 1000,
+)
+
+# Background training runs in worker processes, off the event loop
+training_jobs = TrainingJobManager(max_workers=int(os.getenv("ML_TRAINING_WORKERS", "1")))
+
+# Metrics updated by the data pipeline and read by /metrics
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["route", "method"])
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["route", "method", "status"])
+WS_SEND_LAG = Histogram("ws_send_lag_seconds", "Delay from reading timestamp to WebSocket send completion")
+WS_CONNECTIONS = Counter("ws_connections_total", "WebSocket connections accepted", ["format"])
+WS_BYTES_SENT = Counter("ws_sent_bytes_total", "Payload bytes sent to WebSocket clients", ["format"])
+TEMPERATURE = Gauge("app_temperature_celsius", "Simulated temperature")
+HUMIDITY = Gauge("app_humidity_percent", "Simulated humidity")
+CPU_USAGE = Gauge("system_cpu_usage_percent", "CPU usage percent")
+MEMORY_USAGE = Gauge("system_memory_usage_percent", "Memory usage percent")
+NETWORK_SPEED = Gauge("network_speed_mbps", "Simulated network speed")
+ANOMALY_DETECTED = Gauge("ml_anomaly_detected", "Anomaly detected")
+ANOMALY_SCORE = Gauge("ml_anomaly_score", "Anomaly score")
+READINGS = Counter("sensor_readings_total", "Readings produced by the data pipeline")
+Gauge("ws_connected_clients", "Connected WebSocket clients").set_function(lambda: broadcaster.subscriber_count)
+Counter("ws_dropped_frames_total", "Frames dropped because a client send queue was full").set_function(
+    lambda: broadcaster.dropped)
+Counter("ws_frames_encoded_total", "WebSocket frames serialized").set_function(lambda: ws_frames.encoded)
+Counter("ws_frames_reused_total", "WebSocket frames served from the shared encoding cache").set_function(
+    lambda: ws_frames.reused)
+Gauge("ml_inference_queue_depth", "Readings waiting for a micro-batch").set_function(lambda: inference.queue_depth)
+Gauge("ml_training_samples", "Samples in the training buffer").set_function(lambda: len(ml_model.training_data))
+Gauge("ml_registry_models", "Per-device models held in memory").set_function(lambda: len(model_registry))
+Counter("ml_registry_hits_total", "Per-device model lookups served from memory").set_function(
+    lambda: model_registry.hits)
+Counter("ml_registry_misses_total", "Per-device model lookups that loaded from disk").set_function(
+    lambda: model_registry.misses)
+Counter("ml_registry_evictions_total", "Per-device models evicted from memory").set_function(
+    lambda: model_registry.evictions)
+
+# Followers forward stateful routes to the leader (innermost, so metrics keep route labels)
+if cluster is not None:
+    app.add_middleware(LeaderProxy, cluster=cluster, local_routes=WORKER_LOCAL_ROUTES)
+app.add_middleware(MetricsMiddleware, latency=HTTP_LATENCY, requests=HTTP_REQUESTS)
 
 # Allow CORS from React dev server
 origins_env = os.getenv("FRONTEND_ORIGINS", "http://localhost:3000")
@@ -34,40 +323,32 @@ WEATHER_LAT = float(os.getenv("WEATHER_LAT", "41.015"))  # Istanbul default
 WEATHER_LON = float(os.getenv("WEATHER_LON", "28.979"))
 WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "60"))  # seconds
 
-_weather_cache = {"ts": 0.0, "temp": None, "rh": None}
-_weather_lock = asyncio.Lock()
-
-async def _fetch_open_meteo_current() -> tuple[float | None, float | None]:
-    url = (
-        "https://api.open-meteo.com/v1/forecast"
-        f"?latitude={WEATHER_LAT}&longitude={WEATHER_LON}"
-        "&current=temperature_2m,relative_humidity_2m"
-    )
-    timeout = httpx.Timeout(5.0, read=5.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.get(url)
-        resp.raise_for_status()
-        data = resp.json()
-        current = data.get("current", {})
-        temp = current.get("temperature_2m")
-        rh = current.get("relative_humidity_2m")
-        return temp, rh
+# Pooled, stale-while-revalidate weather lookups keyed by location
+weather = WeatherCache(
+    base_url=os.getenv("WEATHER_API_URL", OPEN_METEO_URL),
+    ttl=WEATHER_CACHE_TTL,
+    max_locations=int(os.getenv("WEATHER_MAX_LOCATIONS", "256")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("WEATHER_BREAKER_FAILURES", "3")),
+        reset_timeout=float(os.getenv("WEATHER_BREAKER_RESET", "30")),
+    ),
+)
+Gauge("weather_breaker_open", "1 while the weather circuit breaker skips upstream calls").set_function(
+    lambda: 0 if weather.breaker.state == "closed" else 1)
+Gauge("weather_cache_locations", "Locations held in the weather cache").set_function(lambda: len(weather))
 
 async def get_weather_values() -> tuple[float | None, float | None]:
-    now = time.time()
-    if now - _weather_cache["ts"] < WEATHER_CACHE_TTL and _weather_cache["temp"] is not None:
-        return _weather_cache["temp"], _weather_cache["rh"]
-    async with _weather_lock:
-        # Double-check after acquiring the lock.
-        if now - _weather_cache["ts"] < WEATHER_CACHE_TTL and _weather_cache["temp"] is not None:
-            return _weather_cache["temp"], _weather_cache["rh"]
-        try:
-            temp, rh = await _fetch_open_meteo_current()
-            _weather_cache.update({"ts": now, "temp": temp, "rh": rh})
-            return temp, rh
-        except Exception as e:
-            logger.warning("weather_fetch_failed", error=str(e))
-            return _weather_cache["temp"], _weather_cache["rh"]
+    return await weather.get(WEATHER_LAT, WEATHER_LON)
+
+def _record_reading_metrics(data: dict):
+    READINGS.inc()
+    TEMPERATURE.set(data["temperature"])
+    HUMIDITY.set(data["humidity"])
+    CPU_USAGE.set(data["cpu_usage"])
+    MEMORY_USAGE.set(data["memory_usage"])
+    NETWORK_SPEED.set(data["network_speed"])
+    ANOMALY_DETECTED.set(1 if data.get("is_anomaly", False) else 0)
+    ANOMALY_SCORE.set(data.get("anomaly_score") or 0)
 
 async def generate_sensor_data_async():
     """Generate sensor data enriched with real weather data."""
@@ -84,8 +365,9 @@ async def generate_sensor_data_async():
     else:
         humidity = float(real_rh) + random.uniform(-1.5, 1.5)
 
-    cpu_usage = psutil.cpu_percent()
-    memory_usage = psutil.virtual_memory().percent
+    system = telemetry.snapshot
+    cpu_usage = system["cpu_percent"]
+    memory_usage = system["memory_percent"]
 
     network_speed = 50 + 30 * math.sin(timestamp / 5) + random.uniform(-10, 10)
     network_speed = max(0, network_speed)
@@ -95,19 +377,8 @@ async def generate_sensor_data_async():
     signal_strength = signal_base + (normalized_speed - 0.5) * 30
     signal_strength = max(0, min(100, signal_strength))
 
-    if signal_strength >= 70:
-        device_status = "online"
-    elif signal_strength >= 40:
-        device_status = "warning"
-    else:
-        device_status = "offline"
-
-    if device_status == "online":
-        status = "active"
-    elif device_status == "warning":
-        status = "warning"
-    else:
-        status = "offline"
+    device_status = device_status_for(signal_strength)
+    status = READING_STATUS[device_status]
 
     base_data = {
         "timestamp": timestamp,
@@ -121,25 +392,64 @@ async def generate_sensor_data_async():
         "status": status,
     }
 
-    ml_analysis = ml_model.add_data_point(base_data)
+    ml_analysis = await inference.submit(base_data)
     base_data.update(ml_analysis)
+    history.append(base_data)
+    rollups.add(base_data)
+    _record_reading_metrics(base_data)
 
     return base_data
 
 @app.get("/data")
 async def get_data():
-    """Return a one-time data snapshot."""
-    return JSONResponse(content=await generate_sensor_data_async())
+    """Return the latest reading the producer published (the leader's in multi-worker mode).
+
+    Reads only: the reading was already scored, stored and counted when it
+    was produced.
+    """
+    data = cluster.ticks.latest() if cluster is not None else latest_reading
+    if data is None:
+        return JSONResponse(content={"error": "no reading produced yet"}, status_code=503,
+                            headers={"Retry-After": "1"})
+    return JSONResponse(content=data)
 
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
-    """Stream live data over WebSocket."""
+    """Stream live data over WebSocket.
+
+    Without query parameters every tick is a full JSON object. Clients can
+    negotiate format=json|msgpack|binary, fields, rate, encoding=full|delta
+    and precision (see ws_protocol.WsOptions); they then get a "hello"
+    text message describing the stream first.
+    """
     await ws.accept()
     try:
+        options = WsOptions(ws.query_params, STREAM_INTERVAL)
+    except ValueError as e:
+        await ws.send_json({"type": "error", "error": str(e)})
+        await ws.close(code=1008)
+        return
+    subscriber = broadcaster.subscribe()
+    WS_CONNECTIONS.inc(format=options.format)
+    last_seq = None
+    try:
+        if not options.legacy:
+            await ws.send_json(options.hello())
         while True:
-            data = await generate_sensor_data_async()
-            await ws.send_json(data)
-            await asyncio.sleep(1)
+            tick = await subscriber.get()
+            if tick.seq % options.divisor:
+                continue
+            # Keyframe on start, after a dropped frame and periodically
+            keyframe = (last_seq is None or tick.seq != last_seq + options.divisor
+                        or (tick.seq // options.divisor) % KEYFRAME_INTERVAL == 0)
+            frame = ws_frames.get(options, tick, keyframe)
+            if isinstance(frame, bytes):
+                await ws.send_bytes(frame)
+            else:
+                await ws.send_text(frame)
+            last_seq = tick.seq
+            WS_BYTES_SENT.inc(len(frame), format=options.format)
+            WS_SEND_LAG.observe(time.time() - tick.produced_at)
     except Exception as e:
         logger.warning("websocket_error", error=str(e))
         if ws.client_state.name != "DISCONNECTED":
@@ -147,63 +457,385 @@ async def websocket_endpoint(ws: WebSocket):
                 await ws.close()
             except Exception:
                 pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+def _series_fields(fields: str | None) -> list[str]:
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(ROLLUP_FIELDS)
+    unknown = [f for f in names if f not in ROLLUP_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return names
+
+@app.get("/history/rollups")
+async def get_history_rollups(
+    t_from: float | None = Query(None, alias="from"),
+    t_to: float | None = Query(None, alias="to"),
+    fields: str | None = None,
+    resolution: int | None = None,
+    max_points: int = 1000,
+):
+    """Return min/max/mean/count buckets, at the finest resolution that fits max_points."""
+    now = time.time()
+    t_to = now if t_to is None else t_to
+    t_from = t_to - 86400 if t_from is None else t_from
+    try:
+        names = _series_fields(fields)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=422)
+    rollup = rollups.get(resolution) if resolution else rollups.choose(t_from, t_to, max_points, now)
+    if rollup is None:
+        return JSONResponse(content={"error": f"no rollup at resolution {resolution}"}, status_code=422)
+
+    buckets = rollup.query(t_from, t_to, names)
+    return JSONResponse(content={
+        "from": t_from,
+        "to": t_to,
+        "resolution": rollup.resolution,
+        "timestamp": buckets["timestamp"].tolist(),
+        "series": {
+            name: {
+                "min": decode_column(name, buckets[name]["min"]),
+                "max": decode_column(name, buckets[name]["max"]),
+                "mean": decode_column(name, buckets[name]["mean"]),
+                "count": buckets[name]["count"].tolist(),
+            }
+            for name in names
+        },
+    })
+
+@app.get("/history/series")
+async def get_history_series(
+    t_from: float | None = Query(None, alias="from"),
+    t_to: float | None = Query(None, alias="to"),
+    fields: str | None = None,
+    max_points: int = 1000,
+):
+    """Return each series LTTB-downsampled to at most max_points points.
+
+    Short ranges are downsampled from raw history; long ranges from the
+    finest rollup means, so the work per request stays bounded.
+    """
+    now = time.time()
+    t_to = now if t_to is None else t_to
+    t_from = t_to - 3600 if t_from is None else t_from
+    try:
+        names = _series_fields(fields)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=422)
+
+    if history.count(t_from, t_to) <= SERIES_RAW_LIMIT:
+        source = "raw"
+        columns = history.query(t_from, t_to, ["timestamp", *names])
+        x = columns["timestamp"]
+        values = {name: columns[name] for name in names}
+    else:
+        rollup = rollups.choose(t_from, t_to, SERIES_RAW_LIMIT, now)
+        source = f"rollup_{rollup.resolution}s"
+        buckets = rollup.query(t_from, t_to, names)
+        x = buckets["timestamp"] + rollup.resolution / 2  # bucket midpoints
+        values = {name: buckets[name]["mean"] for name in names}
+
+    series = {}
+    for name, y in values.items():
+        keep = lttb(x, y, max_points)
+        series[name] = {"timestamp": x[keep].tolist(), "value": y[keep].tolist()}
+    return JSONResponse(content={"from": t_from, "to": t_to, "source": source, "series": series})
 
 @app.get("/stats")
 async def get_stats():
-    """Return system statistics."""
+    """Return system statistics from the latest telemetry snapshot."""
+    system = telemetry.snapshot
     return JSONResponse(content={
-        "uptime": time.time(),
-        "cpu_count": psutil.cpu_count(),
-        "memory_total": psutil.virtual_memory().total,
-        "disk_usage": psutil.disk_usage('/').percent,
+        "uptime": telemetry.uptime,
+        "cpu_count": telemetry.cpu_count,
+        "memory_total": telemetry.memory_total,
+        "disk_usage": system["disk_percent"],
+        "system": system,
+        "weather": weather.stats(),
+        "replay": replay.stats() if replay is not None else None,
+        "cluster": cluster.stats() if cluster is not None else None,
     })
 
+@app.get("/stats/history")
+async def get_stats_history(seconds: float | None = None):
+    """Return recent telemetry samples as columns, oldest first."""
+    return JSONResponse(content={"interval": telemetry.interval, "columns": telemetry.recent(seconds)})
+
 @app.get("/healthz")
 async def healthz():
     return PlainTextResponse("ok")
 
-def format_prometheus_metric(name: str, value, metric_type: str = "gauge", help_text: str = "") -> str:
-    lines = []
-    if help_text:
-        lines.append(f"# HELP {name} {help_text}")
-    if metric_type:
-        lines.append(f"# TYPE {name} {metric_type}")
-    lines.append(f"{name} {value}")
-    return "\n".join(lines)
-
 @app.get("/metrics")
-async def metrics(request: Request):
-    snapshot = await generate_sensor_data_async()
-    parts = [
-        format_prometheus_metric("app_temperature_celsius", snapshot["temperature"], "gauge", "Simulated temperature"),
-        format_prometheus_metric("app_humidity_percent", snapshot["humidity"], "gauge", "Simulated humidity"),
-        format_prometheus_metric("system_cpu_usage_percent", snapshot["cpu_usage"], "gauge", "CPU usage percent"),
-        format_prometheus_metric("system_memory_usage_percent", snapshot["memory_usage"], "gauge", "Memory usage percent"),
-        format_prometheus_metric("network_speed_mbps", snapshot["network_speed"], "gauge", "Simulated network speed"),
-        format_prometheus_metric("ml_anomaly_detected", 1 if snapshot.get("is_anomaly", False) else 0, "gauge", "Anomaly detected"),
-        format_prometheus_metric("ml_anomaly_score", snapshot.get("anomaly_score", 0), "gauge", "Anomaly score"),
-    ]
-    body = "\n".join(parts) + "\n"
-    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+async def metrics():
+    """Render the in-process metrics registry; reads only, never samples or infers."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def _device_model(device_id: str | None) -> SensorDataML:
+    """The shared model for readings without a device_id, else that device's model."""
+    return ml_model if device_id is None else model_registry.get(device_id)
+
+def _invalid_device(error: ValueError) -> JSONResponse:
+    return JSONResponse(content={"error": str(error)}, status_code=422)
 
 @app.post("/ml/train")
-async def train_ml_model():
-    """Train the ML model."""
-    result = ml_model.train_models()
-    return JSONResponse(content=result)
+async def train_ml_model(device_id: str | None = None):
+    """Start a background training job and return its id."""
+    try:
+        model = _device_model(device_id)
+    except ValueError as e:
+        return _invalid_device(e)
+    error = model.check_training_data()
+    if error is not None:
+        return JSONResponse(content=error)
+    # A per-device model may be evicted while training; install on the live one
+    job = training_jobs.submit(model, current=lambda: _device_model(device_id))
+    return JSONResponse(content=job.to_dict(), status_code=202)
+
+@app.get("/ml/train/{job_id}")
+async def get_training_job(job_id: str):
+    """Return status and progress of a training job."""
+    job = await training_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Unknown training job", "job_id": job_id}, status_code=404)
+    return JSONResponse(content=job.to_dict())
+
+ML_SCORE_MAX_ROWS = int(os.getenv("ML_SCORE_MAX_ROWS", "100000"))
+
+def _parse_readings(body: bytes, content_type: str) -> list:
+    """Parse a JSON array or NDJSON body into a list of reading dicts."""
+    text = body.decode("utf-8")
+    if "ndjson" in content_type or not text.lstrip().startswith("["):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return json.loads(text)
+
+def _nullable(values) -> list:
+    """Convert a float array to a JSON list with NaN as null."""
+    return [None if v != v else v for v in values.tolist()]
+
+@app.post("/ml/score")
+async def score_readings(request: Request, device_id: str | None = None):
+    """Score a batch of readings (JSON array or NDJSON) in one pass per model."""
+    try:
+        model = _device_model(device_id)
+    except ValueError as e:
+        return _invalid_device(e)
+    try:
+        readings = _parse_readings(await request.body(), request.headers.get("content-type", ""))
+        if not isinstance(readings, list):
+            raise ValueError("expected a JSON array or NDJSON of readings")
+        if len(readings) > ML_SCORE_MAX_ROWS:
+            raise ValueError(f"at most {ML_SCORE_MAX_ROWS} readings per request")
+        columns = readings_to_columns(readings)
+    except ValueError as e:  # includes JSON decode errors
+        return JSONResponse(content={"error": str(e)}, status_code=422)
+
+    if not model.can_score:
+        return JSONResponse(content={"error": "Model not trained"}, status_code=409)
+    if not readings:
+        return JSONResponse(content={"count": 0})
+
+    scores = model.score_batch(columns)
+    return JSONResponse(content={
+        "count": len(readings),
+        "timestamp": scores["timestamp"].tolist(),
+        "is_anomaly": scores["is_anomaly"].tolist(),
+        "anomaly_score": scores["anomaly_score"].tolist(),
+        "temperature_prediction": _nullable(scores["temperature_prediction"]),
+        "humidity_prediction": _nullable(scores["humidity_prediction"]),
+    })
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "4096"))
+INGEST_MAX_STREAMS = int(os.getenv("INGEST_MAX_STREAMS", "4"))
+_ingest_streams = 0
+
+INGEST_ROWS = Counter("ingest_rows_total", "Rows received by POST /ingest", ["result"])
+INGEST_BATCH_SECONDS = Histogram("ingest_batch_seconds", "Time to score and store one ingest batch")
+
+def _ingest_columns(columns: dict, records: list | None = None) -> int:
+    """Score one validated batch and append it to history and rollups.
+
+    Rows are routed to per-device models by the device_id of the matching
+    record. Returns the number of rows stored; rows with an invalid
+    device_id are dropped.
+    """
+    with INGEST_BATCH_SECONDS.time():
+        n = len(columns["timestamp"])
+        groups = device_groups(records) if records is not None else {None: slice(None)}
+        keep = np.zeros(n, dtype=bool)
+        scored = None
+        for device_id, rows in groups.items():
+            try:
+                model = _device_model(device_id)
+            except ValueError:
+                continue
+            if len(groups) == 1:
+                scored = model.add_columns(columns)
+                keep[:] = True
+                break
+            part = model.add_columns({name: values[rows] for name, values in columns.items()})
+            if scored is None:
+                scored = {name: np.zeros(n, dtype=values.dtype) for name, values in part.items()}
+            for name, values in part.items():
+                scored[name][rows] = values
+            keep[rows] = True
+        if scored is None:
+            return 0
+        if not keep.all():
+            columns = {name: values[keep] for name, values in columns.items()}
+            scored = {name: values[keep] for name, values in scored.items()}
+        history.append_batch(storage_columns(columns, scored))
+        rollups.add_columns(columns)
+        return len(columns["timestamp"])
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    """Stream readings in as NDJSON or binary records.
+
+    The body is consumed chunk by chunk and scored in batches of
+    INGEST_BATCH_SIZE, so it is never fully buffered and a slow pipeline
+    slows the upload itself (TCP backpressure). When INGEST_MAX_STREAMS
+    uploads are already running the request is refused with 429 and a
+    Retry-After header.
+    """
+    global _ingest_streams
+    if _ingest_streams >= INGEST_MAX_STREAMS:
+        return JSONResponse(
+            content={"error": "Ingest capacity exhausted", "active_streams": _ingest_streams},
+            status_code=429,
+            headers={"Retry-After": "1"},
+        )
+
+    binary = request.headers.get("content-type", "").startswith("application/octet-stream")
+    decoder = BinaryDecoder() if binary else NdjsonDecoder()
+    accepted = rejected = 0
+    pending = []  # NDJSON lines, or binary record arrays
+    pending_rows = 0
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal accepted, rejected, pending, pending_rows
+        if binary:
+            # Binary records carry no device_id and always go to the shared model
+            records = np.concatenate(pending) if pending else np.empty(0)
+            parsed = (parse_binary_records(records[i:i + INGEST_BATCH_SIZE]) + (None,)
+                      for i in range(0, len(records), INGEST_BATCH_SIZE))
+        else:
+            parsed = ((columns, bad, readings) for columns, readings, bad in
+                      map(parse_ndjson_lines, batched(pending, INGEST_BATCH_SIZE)))
+        for columns, bad, readings in parsed:
+            stored = _ingest_columns(columns, readings) if len(columns["timestamp"]) else 0
+            accepted += stored
+            rejected += bad + len(columns["timestamp"]) - stored
+        pending, pending_rows = [], 0
+
+    _ingest_streams += 1
+    try:
+        async for chunk in request.stream():
+            items = decoder.feed(chunk)
+            if len(items):
+                if binary:
+                    pending.append(items)
+                else:
+                    pending.extend(items)
+                pending_rows += len(items)
+            if pending_rows >= INGEST_BATCH_SIZE:
+                flush()
+                await asyncio.sleep(0)  # let /ws and other requests run between batches
+        if binary:
+            rejected += 1 if decoder.close() else 0  # truncated trailing record
+        else:
+            pending.extend(decoder.close())
+        flush()
+    finally:
+        _ingest_streams -= 1
+        INGEST_ROWS.inc(accepted, result="accepted")
+        INGEST_ROWS.inc(rejected, result="rejected")
+
+    elapsed = time.perf_counter() - started
+    return JSONResponse(content={
+        "accepted": accepted,
+        "rejected": rejected,
+        "elapsed_seconds": round(elapsed, 4),
+        "rows_per_second": round(accepted / elapsed, 1) if elapsed > 0 else None,
+        "active_streams": _ingest_streams,
+        "max_streams": INGEST_MAX_STREAMS,
+    })
 
 @app.get("/ml/performance")
-async def get_ml_performance():
+async def get_ml_performance(device_id: str | None = None):
     """Return ML model performance metrics."""
-    metrics = ml_model.get_performance_metrics()
+    try:
+        model = _device_model(device_id)
+    except ValueError as e:
+        return _invalid_device(e)
+    metrics = model.get_performance_metrics()
     return JSONResponse(content=metrics)
 
+@app.get("/ml/models")
+async def get_model_versions(device_id: str | None = None):
+    """List saved model versions and the one being served."""
+    try:
+        model = _device_model(device_id)
+    except ValueError as e:
+        return _invalid_device(e)
+    return JSONResponse(content=model.model_versions())
+
+@app.post("/ml/models/rollback")
+async def rollback_models(version: int | None = None, device_id: str | None = None):
+    """Serve an earlier saved model version (default: the previous one)."""
+    try:
+        model = _device_model(device_id)
+    except ValueError as e:
+        return _invalid_device(e)
+    restored = model.rollback(version)
+    if restored is None:
+        return JSONResponse(content={"error": "No model version to roll back to", "version": version},
+                            status_code=404)
+    return JSONResponse(content={"version": restored, "performance": model.get_performance_metrics()})
+
+@app.get("/ml/registry")
+async def get_model_registry():
+    """Return per-device model cache size, hits, misses and evictions."""
+    return JSONResponse(content={**model_registry.stats(), "devices": list(model_registry)})
+
+@app.get("/ml/inference")
+async def get_inference_stats():
+    """Return micro-batching queue depth, batch sizes and latency."""
+    return JSONResponse(content=inference.stats())
+
 @app.get("/ml/anomalies")
-async def get_recent_anomalies(limit: int = 10):
-    """Return recent anomaly detections."""
-    anomalies = ml_model.get_recent_anomalies(limit)
+async def get_recent_anomalies(
+    limit: int = 10,
+    t_from: float | None = Query(None, alias="from"),
+    t_to: float | None = Query(None, alias="to"),
+):
+    """Return recent anomaly detections, newest first."""
+    anomalies = ml_model.get_recent_anomalies(limit, t_from, t_to)
     return JSONResponse(content=anomalies)
 
+@app.get("/history")
+async def get_history(
+    t_from: float | None = Query(None, alias="from"),
+    t_to: float | None = Query(None, alias="to"),
+    fields: str | None = None,
+    limit: int = 100000,
+):
+    """Return stored readings in [from, to] as columns (defaults to the last hour)."""
+    t_to = time.time() if t_to is None else t_to
+    t_from = t_to - 3600 if t_from is None else t_from
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        columns = history.query(t_from, t_to, names, limit=limit)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=422)
+    return JSONResponse(content={
+        "from": t_from,
+        "to": t_to,
+        "count": len(next(iter(columns.values()))),
+        "columns": {name: decode_column(name, values) for name, values in columns.items()},
+    })
+
 @app.get("/settings")
 async def get_settings():
     """Return current settings."""
@@ -213,18 +845,49 @@ async def get_settings():
         "weather_cache_ttl": WEATHER_CACHE_TTL,
         "ml_training_samples": len(ml_model.training_data),
         "ml_is_trained": ml_model.is_trained,
+        "ml_forecast_engine": ml_model.forecast_engine,
+        "ml_forecast_engines": list(FORECAST_ENGINES),
+        "ml_anomaly_engine": ml_model.anomaly_engine,
+        "ml_anomaly_engines": list(ANOMALY_ENGINES),
     })
 
-@app.post("/settings")
-async def update_settings(settings: dict):
-    """Update runtime settings."""
+# Runtime settings POST /settings accepts, and their types
+SETTINGS = {
+    "weather_lat": float,
+    "weather_lon": float,
+    "weather_cache_ttl": int,
+    "ml_forecast_engine": str,
+    "ml_anomaly_engine": str,
+}
+
+def _apply_settings(settings: dict) -> dict:
+    """Apply the known runtime settings and return them; raises ValueError and changes nothing
+    if any is invalid."""
     global WEATHER_LAT, WEATHER_LON, WEATHER_CACHE_TTL
+    try:
+        values = {name: kind(settings[name]) for name, kind in SETTINGS.items() if name in settings}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid setting: {e}") from None
+    engines = {name: values[f"ml_{name}"] for name in ("forecast_engine", "anomaly_engine")
+               if f"ml_{name}" in values}
+    if engines:
+        ml_model.configure(**engines)
+        model_registry.configure(**engines)
+    WEATHER_LAT = values.get("weather_lat", WEATHER_LAT)
+    WEATHER_LON = values.get("weather_lon", WEATHER_LON)
+    if "weather_cache_ttl" in values:
+        WEATHER_CACHE_TTL = values["weather_cache_ttl"]
+        weather.ttl = WEATHER_CACHE_TTL
+    return values
 
-    if "weather_lat" in settings:
-        WEATHER_LAT = float(settings["weather_lat"])
-    if "weather_lon" in settings:
-        WEATHER_LON = float(settings["weather_lon"])
-    if "weather_cache_ttl" in settings:
-        WEATHER_CACHE_TTL = int(settings["weather_cache_ttl"])
+@app.post("/settings")
+async def update_settings(settings: dict):
+    """Update runtime settings; in multi-worker mode every worker picks them up."""
+    try:
+        values = _apply_settings(settings)
+    except ValueError as e:
+        return JSONResponse(content={"success": False, "error": str(e)}, status_code=422)
+    if cluster is not None:
+        cluster.settings.update(values)
 
     return JSONResponse(content={"success": True, "message": "Settings updated"})
@@ -0,0 +1,198 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from 100 µs to 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named family of samples keyed by label values."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, help_text: str = "", labelnames: Sequence[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._header = f"# HELP {name} {help_text}\n# TYPE {name} {self.metric_type}\n"
+        self._label_cache: Dict[Tuple, str] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: Tuple, extra: str = "") -> str:
+        """Rendered `{a="x",b="y"}` label set, cached per label tuple"""
+        cache_key = key + (extra,)
+        text = self._label_cache.get(cache_key)
+        if text is None:
+            pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+            if extra:
+                pairs.append(extra)
+            text = "{" + ",".join(pairs) + "}" if pairs else ""
+            self._label_cache[cache_key] = text
+        return text
+
+    def render(self, out: List[str]):
+        raise NotImplementedError
+
+
+class _ValueMetric(Metric):
+    """Shared storage for counters and gauges: one number per label tuple."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from `function` at scrape time (unlabelled metrics only)"""
+        self._function = function
+
+    def value(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def render(self, out: List[str]):
+        out.append(self._header)
+        if self._function is not None:
+            out.append(f"{self.name} {_format_value(self._function())}\n")
+            return
+        for key, value in self._values.items():
+            out.append(f"{self.name}{self._labels(key)} {_format_value(value)}\n")
+
+
+class Counter(_ValueMetric):
+    metric_type = "counter"
+
+
+class Gauge(_ValueMetric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, help_text: str = "", labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        super().__init__(name, help_text, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._le = [f'le="{_format_value(b)}"' for b in self.buckets] + ['le="+Inf"']
+        # Per label tuple: [per-bucket counts (non-cumulative, last is +Inf), sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def render(self, out: List[str]):
+        out.append(self._header)
+        name = self.name
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for le, count in zip(self._le, counts):
+                cumulative += count
+                out.append(f"{name}_bucket{self._labels(key, le)} {cumulative}\n")
+            labels = self._labels(key)
+            out.append(f"{name}_sum{labels} {_format_value(total)}\n")
+            out.append(f"{name}_count{labels} {cumulative}\n")
+
+
+class Registry:
+    """Holds metric families and renders the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        out: List[str] = []
+        for metric in self._metrics.values():
+            metric.render(out)
+        return "".join(out)
+
+
+# Process-wide default registry
+REGISTRY = Registry()
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and count per route template."""
+
+    def __init__(self, app, latency: Histogram, requests: Counter):
+        self.app = app
+        self.latency = latency
+        self.requests = requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # Label by template (/ml/train/{job_id}), never by raw path
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.latency.observe(time.perf_counter() - start, route=path, method=method)
+            self.requests.inc(route=path, method=method, status=status[0])
@@ -6,34 +6,488 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.model_selection import train_test_split
+from scipy.signal import lfilter
 import math
 import joblib
 import os
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 import time
 
-class SensorDataML:
-    def __init__(self, model_dir: str = "models"):
-        self.model_dir = model_dir
-        os.makedirs(model_dir, exist_ok=True)
-        
+import artifacts
+from metrics import Histogram
+from ring_buffer import RingBuffer
+from windowing import lag_matrix, training_pairs
+
+# Number of values produced by extract_features_batch per reading
+N_FEATURES = 13
+
+# Minimum samples before train_models will run
+MIN_TRAINING_SAMPLES = 100
+
+FEATURE_SECONDS = Histogram("ml_feature_extraction_seconds", "Feature extraction time per batch")
+INFERENCE_SECONDS = Histogram("ml_inference_seconds", "Model inference time per batch")
+TRAINING_SECONDS = Histogram("ml_training_seconds", "Model training time",
+                             buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+# Forecasting engines selectable per SensorDataML (see set via configure)
+FORECAST_ENGINES = ("random_forest", "online")
+
+# Anomaly engines: batch-trained IsolationForest or the streaming z-score detector
+ANOMALY_ENGINES = ("isolation_forest", "streaming")
+
+# One-step forecast errors kept for the rolling error metrics
+ROLLING_ERROR_WINDOW = 500
+
+# Reading fields the feature extraction reads besides the timestamp
+FEATURE_INPUTS = ("temperature", "humidity", "cpu_usage", "memory_usage", "network_speed")
+
+
+def readings_to_columns(readings: List[Dict]) -> Dict[str, np.ndarray]:
+    """Convert reading dicts to float64 columns, validating required fields"""
+    columns = {}
+    for field in ("timestamp",) + FEATURE_INPUTS:
+        try:
+            columns[field] = np.array([r[field] for r in readings], dtype=np.float64)
+        except KeyError:
+            missing = next(i for i, r in enumerate(readings) if field not in r)
+            raise ValueError(f"reading {missing} is missing field '{field}'")
+        except (TypeError, ValueError):
+            raise ValueError(f"field '{field}' must be numeric in every reading")
+        if not np.isfinite(columns[field]).all():
+            raise ValueError(f"field '{field}' must be a finite number in every reading")
+    return columns
+
+
+def extract_features_batch(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """One (n, N_FEATURES) feature matrix for n readings"""
+    timestamp = columns["timestamp"]
+    n = len(timestamp)
+    out = np.empty((n, N_FEATURES), dtype=np.float64)
+
+    # Time features
+    hour = (timestamp % 86400) / 3600  # Hour of day
+    day_of_week = (timestamp // 86400) % 7  # Day of week
+
+    for i, field in enumerate(FEATURE_INPUTS):
+        out[:, i] = columns[field]
+    out[:, 5] = hour
+    out[:, 6] = day_of_week
+    out[:, 7] = np.sin(hour * 2 * np.pi / 24)  # Hourly cycle
+    out[:, 8] = np.cos(hour * 2 * np.pi / 24)
+    out[:, 9] = np.sin(day_of_week * 2 * np.pi / 7)  # Weekly cycle
+    out[:, 10] = np.cos(day_of_week * 2 * np.pi / 7)
+    # Trend features
+    out[:, 11] = out[:, 0] * out[:, 1]  # Interaction
+    out[:, 12] = out[:, 2] * out[:, 3]  # System load
+    return out
+
+
+class FeaturePipeline:
+    """Feature rows and lag windows for one ordered stream of readings.
+
+    The last `window_size + 1` feature rows live in a preallocated
+    RingBuffer, so the current lag window and the one before it are
+    contiguous views shared by every predictor. push() writes one reading's
+    features through a preallocated row and allocates no arrays; push_batch()
+    is the bulk form and builds the whole feature matrix at once. Both
+    return (features, series, history): `series` is the `history` rows
+    preceding the new ones followed by the new rows, ready for lag_matrix.
+    """
+
+    def __init__(self, window_size: int, n_features: int = N_FEATURES):
+        self.window_size = window_size
+        self.rows = RingBuffer(window_size + 1, n_features)
+        self._row = np.zeros(n_features)
+
+    @property
+    def count(self) -> int:
+        """Feature rows pushed since the last reset"""
+        return self.rows.total_appended
+
+    def window(self) -> np.ndarray:
+        """The lag window ending at the latest reading, shape (1, window_size * n_features)"""
+        return self.rows.view(self.window_size).reshape(1, -1)
+
+    def reset(self, samples: Optional[np.ndarray] = None):
+        """Forget the stream, or continue it from the trailing rows of `samples`"""
+        self.rows.clear()
+        if samples is not None and len(samples):
+            self.rows.extend(samples[-self.rows.capacity:])
+
+    def push(self, data: Dict) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Append one reading; validated like readings_to_columns"""
+        row = self._row
+        timestamp = self._value(data, "timestamp")
+        for i, field in enumerate(FEATURE_INPUTS):
+            row[i] = self._value(data, field)
+
+        # Time features
+        hour = (timestamp % 86400) / 3600  # Hour of day
+        day_of_week = (timestamp // 86400) % 7  # Day of week
+        row[5] = hour
+        row[6] = day_of_week
+        row[7] = math.sin(hour * 2 * math.pi / 24)  # Hourly cycle
+        row[8] = math.cos(hour * 2 * math.pi / 24)
+        row[9] = math.sin(day_of_week * 2 * math.pi / 7)  # Weekly cycle
+        row[10] = math.cos(day_of_week * 2 * math.pi / 7)
+        # Trend features
+        row[11] = row[0] * row[1]  # Interaction
+        row[12] = row[2] * row[3]  # System load
+
+        history = min(self.count, self.window_size)
+        self.rows.append(row)
+        series = self.rows.view(history + 1)
+        return series[history:], series, history
+
+    def push_batch(self, columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Append many validated reading columns at once"""
+        features = extract_features_batch(columns)
+        history = self.rows.view(self.window_size)
+        series = np.concatenate([history, features])
+        self.rows.extend(features[-self.rows.capacity:])
+        return features, series, len(history)
+
+    @staticmethod
+    def transform(columns: Dict[str, np.ndarray], window_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Features and lag windows of a standalone series, without touching any stream"""
+        features = extract_features_batch(columns)
+        return features, lag_matrix(features, window_size)
+
+    @staticmethod
+    def _value(data: Dict, field: str) -> float:
+        try:
+            value = float(data[field])
+        except KeyError:
+            raise ValueError(f"reading 0 is missing field '{field}'")
+        except (TypeError, ValueError):
+            raise ValueError(f"field '{field}' must be numeric in every reading")
+        if not math.isfinite(value):
+            raise ValueError(f"field '{field}' must be a finite number in every reading")
+        return value
+
+
+class ModelBundle:
+    """One consistent set of fitted models.
+
+    SensorDataML only ever holds a reference to a complete bundle, so a newly
+    trained bundle is installed with a single assignment and inference never
+    sees a scaler from one training run mixed with trees from another.
+    """
+
+    def __init__(self, scaler=None, anomaly_detector=None, temperature_predictor=None,
+                 humidity_predictor=None, metrics: Optional[Dict] = None, is_trained: bool = False):
+        # Data preprocessing
+        self.scaler = scaler if scaler is not None else StandardScaler()
+
         # Isolation Forest for anomaly detection
-        self.anomaly_detector = IsolationForest(
+        self.anomaly_detector = anomaly_detector if anomaly_detector is not None else IsolationForest(
             contamination=0.1,  # 10% anomaly expected
             random_state=42
         )
-        
+
         # Random Forest for prediction (better performance)
-        self.temperature_predictor = RandomForestRegressor(n_estimators=50, random_state=42)
-        self.humidity_predictor = RandomForestRegressor(n_estimators=50, random_state=42)
+        self.temperature_predictor = (temperature_predictor if temperature_predictor is not None
+                                      else RandomForestRegressor(n_estimators=50, random_state=42))
+        self.humidity_predictor = (humidity_predictor if humidity_predictor is not None
+                                   else RandomForestRegressor(n_estimators=50, random_state=42))
+
+        self.metrics = metrics or {}
+        self.is_trained = is_trained
+        # Total samples seen by the source buffer when the training snapshot was taken
+        self.snapshot_count = 0
+        # Artifact version this bundle was saved as (see artifacts.py)
+        self.version: Optional[int] = None
+
+
+def fit_models(samples: np.ndarray, window_size: int = 5,
+               progress: Optional[Callable[[str, float], None]] = None) -> ModelBundle:
+    """Fit a fresh ModelBundle on a snapshot of training samples.
+
+    Pure function of its inputs so it can run in a worker process; `progress`
+    is called with (stage, fraction) as training advances.
+    """
+    def report(stage: str, fraction: float):
+        if progress is not None:
+            progress(stage, fraction)
+
+    X = np.ascontiguousarray(samples, dtype=np.float64)
+    bundle = ModelBundle()
+    test_data = None
+
+    # Anomaly detection training
+    report("scaling", 0.05)
+    bundle.scaler.fit(X)
+    X_scaled = bundle.scaler.transform(X)
+    report("anomaly_detector", 0.15)
+    bundle.anomaly_detector.fit(X_scaled)
+
+    # Sliding window approach for prediction models
+    if len(X) >= 20:  # More data required
+        # Lag matrix is a strided view over the samples, no per-row copies
+        X_windows, targets = training_pairs(X, window_size)
+        y_temp_windows = targets[:, 0]  # Temperature
+        y_humidity_windows = targets[:, 1]  # Humidity
+
+        if len(X_windows) >= 5:  # At least 5 windows required
+            # Train/test split
+            X_train, X_test, y_temp_train, y_temp_test = train_test_split(
+                X_windows, y_temp_windows, test_size=0.2, random_state=42
+            )
+            _, _, y_humidity_train, y_humidity_test = train_test_split(
+                X_windows, y_humidity_windows, test_size=0.2, random_state=42
+            )
+
+            # Train models
+            report("temperature_predictor", 0.35)
+            bundle.temperature_predictor.fit(X_train, y_temp_train)
+            report("humidity_predictor", 0.65)
+            bundle.humidity_predictor.fit(X_train, y_humidity_train)
+
+            test_data = (X_test, y_temp_test, y_humidity_test)
+
+    # Performance evaluation
+    report("evaluating", 0.9)
+    bundle.metrics = _evaluate_bundle(bundle, X_scaled, test_data)
+    bundle.metrics["last_training_time"] = time.time()
+    bundle.is_trained = True
+    report("done", 1.0)
+    return bundle
+
+
+def _evaluate_bundle(bundle: ModelBundle, X_scaled: np.ndarray, test_data: Optional[Tuple]) -> Dict:
+    """Evaluate model performance"""
+    metrics = {}
+
+    # Anomaly detection performance (simple heuristic)
+    anomaly_rate = np.mean(bundle.anomaly_detector.predict(X_scaled) == -1)
+    metrics["anomaly_detection_accuracy"] = 1.0 - abs(anomaly_rate - 0.1)
+
+    # Prediction performance - use test data if available
+    if test_data is not None:
+        X_test, y_temp_test, y_humidity_test = test_data
+
+        temp_pred = bundle.temperature_predictor.predict(X_test)
+        humidity_pred = bundle.humidity_predictor.predict(X_test)
+
+        metrics["temperature_prediction_r2"] = max(0, r2_score(y_temp_test, temp_pred))
+        metrics["humidity_prediction_r2"] = max(0, r2_score(y_humidity_test, humidity_pred))
+    else:
+        # Fallback: simple evaluation
+        metrics["temperature_prediction_r2"] = 0.0
+        metrics["humidity_prediction_r2"] = 0.0
+    return metrics
+
+
+def save_bundle(bundle: ModelBundle, model_dir: str, samples: np.ndarray, window_size: int) -> int:
+    """Write the bundle and its training samples as a new artifact version"""
+    scaler = bundle.scaler
+    manifest = {
+        "window_size": window_size,
+        "n_features": N_FEATURES,
+        "samples": len(samples),
+        "metrics": bundle.metrics,
+        "scaler": {
+            "mean": scaler.mean_.tolist() if hasattr(scaler, "mean_") else None,
+            "scale": scaler.scale_.tolist() if hasattr(scaler, "scale_") else None,
+        },
+    }
+    models = {
+        "scaler": bundle.scaler,
+        "anomaly_detector": bundle.anomaly_detector,
+        "temperature_predictor": bundle.temperature_predictor,
+        "humidity_predictor": bundle.humidity_predictor,
+    }
+    bundle.version = artifacts.write_version(model_dir, models, samples, manifest)
+    return bundle.version
+
+
+def load_bundle(model_dir: str, version: int, mmap: bool = True) -> Tuple[ModelBundle, np.ndarray]:
+    """Load an artifact version as an installed-ready bundle plus its training samples"""
+    models, samples, manifest = artifacts.read_version(model_dir, version, mmap=mmap)
+    bundle = ModelBundle(metrics=manifest.get("metrics"), is_trained=True, **models)
+    bundle.version = version
+    return bundle, samples
+
+
+class OnlineForecaster:
+    """Normalized LMS forecaster on lag windows, learning one step at a time.
+
+    Inputs are standardized with exponentially weighted per-feature
+    statistics, and the model predicts the change from the latest
+    temperature/humidity. It therefore starts out as a persistence forecast
+    and improves as it learns. An update costs O(window_size * N_FEATURES)
+    and there is no separate training phase.
+    """
+
+    TARGETS = (0, 1)  # temperature, humidity feature columns
+
+    def __init__(self, window_size: int, n_features: int = N_FEATURES,
+                 step: float = 0.05, decay: float = 0.01):
+        self.window_size = window_size
+        self.n_features = n_features
+        self.step = step
+        self.decay = decay
+        self.weights = np.zeros((window_size * n_features + 1, len(self.TARGETS)))
+        self.mean = np.zeros(n_features)
+        self.var = np.ones(n_features)
+        self.updates = 0
+
+    def _inputs(self, windows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Standardized inputs with a bias column, and the latest target values"""
+        w = windows.reshape(len(windows), self.window_size, self.n_features)
+        z = (w - self.mean) / (np.sqrt(self.var) + 1e-3)
+        X = np.empty((len(w), self.weights.shape[0]))
+        X[:, :-1] = z.reshape(len(w), -1)
+        X[:, -1] = 1.0
+        return X, w[:, -1, self.TARGETS]
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+        """Next temperature/humidity for each lag window, shape (n, 2)"""
+        X, last = self._inputs(windows)
+        return last + X @ self.weights
+
+    def update(self, windows: np.ndarray, targets: np.ndarray):
+        """Learn from (window, next temperature/humidity) pairs.
+
+        Several pairs are applied as one averaged NLMS step, which reduces
+        to the classic single-sample update when there is one pair.
+        """
+        if len(windows) == 0:
+            return
+        newest = windows.reshape(len(windows), self.window_size, self.n_features)[:, -1]
+        if self.updates == 0:
+            self.mean = newest.mean(axis=0)
+            self.var = np.maximum(newest.var(axis=0), 1.0)
+        else:
+            rate = 1.0 - (1.0 - self.decay) ** len(newest)
+            self.mean += rate * (newest.mean(axis=0) - self.mean)
+            self.var += rate * (((newest - self.mean) ** 2).mean(axis=0) - self.var)
+        X, last = self._inputs(windows)
+        residual = (targets - last) - X @ self.weights
+        power = np.einsum("ij,ij->", X, X) / len(X)
+        self.weights += self.step * (X.T @ residual) / (len(X) * (power + 1e-6))
+        self.updates += len(X)
+
+
+class StreamingAnomalyDetector:
+    """Exponentially weighted z-score detector that learns from every point.
+
+    Keeps an EWMA mean and variance per sensor feature (calendar features
+    are skipped) and scores each reading against the statistics from
+    before it. Scores follow IsolationForest.decision_function: negative
+    means anomalous, i.e. some feature is more than `threshold` weighted
+    standard deviations from its mean. Memory is O(features). The EWMA
+    recursions run through lfilter, so a batch costs the same as feeding
+    the points one at a time, but in vectorized form.
+    """
+
+    FEATURES = (0, 1, 2, 3, 4, 11, 12)  # sensor readings and their interactions
+
+    def __init__(self, alpha: float = 0.01, threshold: float = 3.5, warmup: int = 30):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.mean: Optional[np.ndarray] = None
+        self.var = np.zeros(len(self.FEATURES))
+        self.count = 0
+
+    def _scores(self, deviation: np.ndarray, var: np.ndarray, mean: np.ndarray) -> np.ndarray:
+        # Floor the deviation so near-constant features do not explode
+        std = np.sqrt(var + (1e-3 * (np.abs(mean) + 1.0)) ** 2)
+        return 1.0 - np.max(np.abs(deviation) / std, axis=1) / self.threshold
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        """Score rows against the current statistics without learning from them"""
+        if self.mean is None:
+            return np.ones(len(features))
+        x = features[:, self.FEATURES]
+        return self._scores(x - self.mean, self.var, self.mean)
+
+    def update(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score each row against the statistics before it, then learn from it.
+
+        Returns (scores, is_anomaly); nothing is flagged during warm-up.
+        """
+        n = len(features)
+        x = features[:, self.FEATURES]
+        if n == 0:
+            return np.zeros(0), np.zeros(0, dtype=bool)
+        if self.mean is None:
+            self.mean = x[0].copy()
+        a = self.alpha
+        if n == 1:
+            # Single reading (the /ws path): the recursions directly, no filter setup
+            mean_before, var_before = self.mean[None, :], self.var[None, :]
+            deviation = x - mean_before
+            scores = self._scores(deviation, var_before, mean_before)
+            is_anomaly = (scores < 0) & (self.count >= self.warmup)
+            self.mean = self.mean + a * deviation[0]
+            self.var = (1.0 - a) * (self.var + a * deviation[0] ** 2)
+            self.count += 1
+            return scores, is_anomaly
+        den = [1.0, -(1.0 - a)]
+
+        # mean_i = (1 - a) mean_{i-1} + a x_i; row i is scored against mean_{i-1}
+        means = lfilter([a], den, x, axis=0, zi=((1.0 - a) * self.mean)[None, :])[0]
+        mean_before = np.vstack([self.mean, means[:-1]])
+        deviation = x - mean_before
+        # var_i = (1 - a) var_{i-1} + a (1 - a) deviation_i^2
+        variances = lfilter([a * (1.0 - a)], den, deviation ** 2, axis=0,
+                            zi=((1.0 - a) * self.var)[None, :])[0]
+        var_before = np.vstack([self.var, variances[:-1]])
+
+        scores = self._scores(deviation, var_before, mean_before)
+        seen = self.count + np.arange(n)
+        is_anomaly = (scores < 0) & (seen >= self.warmup)
+        self.mean, self.var = means[-1].copy(), variances[-1].copy()
+        self.count += n
+        return scores, is_anomaly
+
+
+class SensorDataML:
+    def __init__(self, model_dir: str = "models", max_training_samples: int = 1000,
+                 window_size: int = 5, history=None, keep_versions: int = 5,
+                 forecast_engine: str = "random_forest", anomaly_engine: str = "isolation_forest",
+                 training_buffer: Optional[RingBuffer] = None):
+        if forecast_engine not in FORECAST_ENGINES:
+            raise ValueError(f"unknown forecast engine: {forecast_engine}")
+        if anomaly_engine not in ANOMALY_ENGINES:
+            raise ValueError(f"unknown anomaly engine: {anomaly_engine}")
+        self.model_dir = model_dir
+        os.makedirs(model_dir, exist_ok=True)
+        # Saved artifact versions kept for rollback
+        self.keep_versions = keep_versions
         
-        # Data preprocessing
-        self.scaler = StandardScaler()
+        # Optional HistoryStore that keeps readings and the anomaly log on disk
+        self.history = history
+        
+        # Fitted models; replaced atomically by install_models
+        self.models = ModelBundle()
         
         # Model status
-        self.is_trained = False
-        self.training_data = []
-        self.max_training_samples = 1000
+        self.max_training_samples = max_training_samples
+        # Callers may supply the buffer, e.g. a SharedRingBuffer other processes read
+        if training_buffer is None:
+            training_buffer = RingBuffer(max_training_samples, N_FEATURES)
+        elif (training_buffer.capacity, training_buffer.width) != (max_training_samples, N_FEATURES):
+            raise ValueError("training_buffer must hold max_training_samples rows of N_FEATURES")
+        self.training_data = training_buffer
+        # Sliding window: predict next value from the last `window_size` data points
+        self.window_size = window_size
+        # Feature rows and lag windows of the live stream, shared by every model
+        self.pipeline = FeaturePipeline(window_size)
+        
+        # Forecasting engine: batch-trained random forests or the online forecaster,
+        # which learns from every point whichever engine is serving
+        self.forecast_engine = forecast_engine
+        self.online_forecaster = OnlineForecaster(window_size)
+        # Anomaly engine: IsolationForest or the streaming detector, which also
+        # learns from every point whichever engine is serving
+        self.anomaly_engine = anomaly_engine
+        self.streaming_detector = StreamingAnomalyDetector()
+        # Served one-step forecast errors and actuals, for the rolling metrics
+        self.forecast_errors = RingBuffer(ROLLING_ERROR_WINDOW, 4)
+        self._pending_forecast: Optional[np.ndarray] = None
         
         # Performance metrics
         self.performance_metrics = {
@@ -44,145 +498,254 @@ class SensorDataML:
             "total_predictions": 0,
             "total_anomalies_detected": 0
         }
+
+    @property
+    def is_trained(self) -> bool:
+        return self.models.is_trained
+
+    @property
+    def can_score(self) -> bool:
+        """Whether score_batch can run: the selected engines need no training or are trained"""
+        return self.models.is_trained or (self.forecast_engine == "online"
+                                          and self.anomaly_engine == "streaming")
+
+    @property
+    def scaler(self):
+        return self.models.scaler
+
+    @property
+    def anomaly_detector(self):
+        return self.models.anomaly_detector
+
+    @property
+    def temperature_predictor(self):
+        return self.models.temperature_predictor
+
+    @property
+    def humidity_predictor(self):
+        return self.models.humidity_predictor
     
     def add_data_point(self, data: Dict) -> Dict:
         """Add new data point and perform anomaly check"""
-        features = self._extract_features(data)
+        return self.add_data_points([data])[0]
+    
+    def add_data_points(self, readings: List[Dict]) -> List[Dict]:
+        """Add several data points in order and score them together.
+
+        Equivalent to calling add_data_point on each reading in turn, but every
+        model runs once over the whole group instead of once per reading.
+        """
+        if not readings:
+            return []
+        with FEATURE_SECONDS.time():
+            if len(readings) == 1:
+                # The per-tick path: no per-reading arrays, lists or copies
+                stream = self.pipeline.push(readings[0])
+            else:
+                stream = self.pipeline.push_batch(readings_to_columns(readings))
+        scored = self._add_features(*stream)
         
-        result = {
+        is_anomaly = scored["is_anomaly"].tolist()
+        anomaly_score = scored["anomaly_score"].tolist()
+        temp_pred = scored["temperature_prediction"].tolist()
+        humidity_pred = scored["humidity_prediction"].tolist()
+        confidence = scored["prediction_confidence"].tolist()
+        return [{
             "timestamp": data["timestamp"],
-            "is_anomaly": False,
-            "anomaly_score": 0.0,
-            "temperature_prediction": None,
-            "humidity_prediction": None,
-            "prediction_confidence": 0.0
+            "is_anomaly": is_anomaly[i],
+            "anomaly_score": anomaly_score[i],
+            "temperature_prediction": None if temp_pred[i] != temp_pred[i] else temp_pred[i],
+            "humidity_prediction": None if humidity_pred[i] != humidity_pred[i] else humidity_pred[i],
+            "prediction_confidence": confidence[i]
+        } for i, data in enumerate(readings)]
+    
+    def add_columns(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Columnar add_data_points for bulk paths: validated columns in, result arrays out"""
+        with FEATURE_SECONDS.time():
+            stream = self.pipeline.push_batch(columns)
+        return self._add_features(*stream)
+    
+    def _add_features(self, features: np.ndarray, series: np.ndarray, history: int) -> Dict[str, np.ndarray]:
+        """Append feature rows to the training set and score them in one pass per model.
+
+        `series` is the `history` pipeline rows before `features` followed by
+        `features` itself (see FeaturePipeline.push).
+        """
+        n = len(features)
+        models = self.models  # one consistent bundle for the whole call
+        
+        result = {
+            "is_anomaly": np.zeros(n, dtype=bool),
+            "anomaly_score": np.zeros(n),
+            "temperature_prediction": np.full(n, np.nan),
+            "humidity_prediction": np.full(n, np.nan),
+            "prediction_confidence": np.zeros(n),
         }
         
         # Add data to training set
-        self.training_data.append(features)
-        if len(self.training_data) > self.max_training_samples:
-            self.training_data.pop(0)
+        before = len(self.training_data)
+        self.training_data.extend(features)
+        
+        # Buffer size as seen right after each reading was appended
+        sizes = np.minimum(before + np.arange(1, n + 1), self.max_training_samples)
+        lags = lag_matrix(series, self.window_size)
+        offset = history - self.window_size + 1  # lags row of the window ending at each reading
+        
+        # Pairs of (window ending at the previous reading, this reading) for the online forecaster
+        learn = np.flatnonzero(np.arange(n) + history >= self.window_size)
+        pairs = (lags[learn + offset - 1], features[learn][:, OnlineForecaster.TARGETS])
+        online = self.forecast_engine == "online"
+        # The first pair is already known when the batch arrives; later ones are
+        # learned after the batch is forecast so no reading sees its own future
+        split = 1 if len(learn) and learn[0] == 0 else 0
+        self.online_forecaster.update(pairs[0][:split], pairs[1][:split])
+        
+        streaming = self.anomaly_engine == "streaming"
+        stream_scores, stream_anomalies = self.streaming_detector.update(features)
         
         # Make predictions if model is trained
-        if self.is_trained and len(self.training_data) >= 10:
-            try:
-                scaled_features = self.scaler.transform([features])
-                # Anomaly detection
-                anomaly_score = self.anomaly_detector.decision_function(scaled_features)[0]
-                is_anomaly = self.anomaly_detector.predict(scaled_features)[0] == -1
-
-                result.update({
-                    "is_anomaly": bool(is_anomaly),
-                    "anomaly_score": float(anomaly_score)
-                })
-
-                if is_anomaly:
-                    self.performance_metrics["total_anomalies_detected"] += 1
-            except NotFittedError:
-                pass
+        if models.is_trained or online or streaming:
+            inference_started = time.perf_counter()
+            scored = np.flatnonzero(sizes >= 10)
+            if streaming:
+                result["anomaly_score"] = stream_scores
+                result["is_anomaly"] = stream_anomalies
+                self.performance_metrics["total_anomalies_detected"] += int(np.count_nonzero(stream_anomalies))
+            elif len(scored) and models.is_trained:
+                try:
+                    # Anomaly detection (predict == -1 is decision_function < 0)
+                    scores = models.anomaly_detector.decision_function(
+                        models.scaler.transform(features[scored]))
+                    result["anomaly_score"][scored] = scores
+                    result["is_anomaly"][scored] = scores < 0
+                    self.performance_metrics["total_anomalies_detected"] += int(np.count_nonzero(scores < 0))
+                except NotFittedError:
+                    pass
             
-            # Temperature prediction
-            if len(self.training_data) >= 5:
-                temp_pred = self._predict_temperature(features)
-                humidity_pred = self._predict_humidity(features)
-                
-                result.update({
-                    "temperature_prediction": temp_pred,
-                    "humidity_prediction": humidity_pred,
-                    "prediction_confidence": self._calculate_confidence()
-                })
+            # Temperature and humidity prediction from the lag window ending at each reading
+            forecast = scored[sizes[scored] >= self.window_size]
+            if len(forecast):
+                windows = lags[forecast + offset]
+                if online:
+                    predicted = self.online_forecaster.predict(windows)
+                    temp_pred, humidity_pred = predicted[:, 0], predicted[:, 1]
+                else:
+                    temp_pred = self._predict(models.temperature_predictor, windows)
+                    humidity_pred = self._predict(models.humidity_predictor, windows)
+                if temp_pred is not None:
+                    result["temperature_prediction"][forecast] = temp_pred
+                if humidity_pred is not None:
+                    result["humidity_prediction"][forecast] = humidity_pred
+                result["prediction_confidence"][forecast] = self._confidence_for(sizes[forecast])
+            INFERENCE_SECONDS.observe(time.perf_counter() - inference_started)
         
-        self.performance_metrics["total_predictions"] += 1
+        self.online_forecaster.update(pairs[0][split:], pairs[1][split:])
+        self._track_forecast_errors(features, result)
+        self.performance_metrics["total_predictions"] += n
         return result
     
-    def _extract_features(self, data: Dict) -> List[float]:
-        """Extract feature vector from data point"""
-        timestamp = data["timestamp"]
-        
-        # Time features
-        hour = (timestamp % 86400) / 3600  # Hour of day
-        day_of_week = (timestamp // 86400) % 7  # Day of week
-        
-        # More meaningful features
-        return [
-            data["temperature"],
-            data["humidity"],
-            data["cpu_usage"],
-            data["memory_usage"],
-            data["network_speed"],
-            hour,
-            day_of_week,
-            math.sin(hour * 2 * math.pi / 24),  # Hourly cycle
-            math.cos(hour * 2 * math.pi / 24),
-            math.sin(day_of_week * 2 * math.pi / 7),  # Weekly cycle
-            math.cos(day_of_week * 2 * math.pi / 7),
-            # Trend features
-            data["temperature"] * data["humidity"],  # Interaction
-            data["cpu_usage"] * data["memory_usage"],  # System load
-        ]
+    @staticmethod
+    def _predict(predictor, windows: np.ndarray) -> Optional[np.ndarray]:
+        """Run one regressor over a stack of lag windows, None if it cannot predict"""
+        try:
+            return predictor.predict(windows)
+        except Exception:
+            return None
     
-    def train_models(self) -> Dict:
-        """Train models"""
-        if len(self.training_data) < 100:
+    def _track_forecast_errors(self, features: np.ndarray, result: Dict[str, np.ndarray]):
+        """Record how far each served forecast was from the reading that followed it"""
+        forecasts = np.column_stack([result["temperature_prediction"], result["humidity_prediction"]])
+        previous = np.empty_like(forecasts)
+        previous[0] = self._pending_forecast if self._pending_forecast is not None else np.nan
+        previous[1:] = forecasts[:-1]
+        actual = features[:, OnlineForecaster.TARGETS]
+        known = ~np.isnan(previous).any(axis=1)
+        if known.any():
+            self.forecast_errors.extend(np.column_stack([actual - previous, actual])[known])
+        self._pending_forecast = forecasts[-1]
+    
+    def score_batch(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Score many readings with one call per model.
+
+        Readings are treated as one ordered series: the forecast at row i uses
+        the lag window ending at row i, so the first `window_size - 1` rows get
+        NaN predictions. Neither the training buffer nor counters are touched.
+        """
+        models = self.models
+        if not self.can_score:
+            raise NotFittedError("Model is not trained")
+        with FEATURE_SECONDS.time():
+            features, windows = FeaturePipeline.transform(columns, self.window_size)
+        n = len(features)
+        inference_started = time.perf_counter()
+
+        if self.anomaly_engine == "streaming":
+            scores = self.streaming_detector.score(features)
+        else:
+            # IsolationForest.predict is just decision_function < 0, so one pass gives both
+            scores = models.anomaly_detector.decision_function(models.scaler.transform(features))
+
+        temp_pred = np.full(n, np.nan)
+        humidity_pred = np.full(n, np.nan)
+        if len(windows) and self.forecast_engine == "online":
+            predicted = self.online_forecaster.predict(windows)
+            temp_pred[self.window_size - 1:] = predicted[:, 0]
+            humidity_pred[self.window_size - 1:] = predicted[:, 1]
+        elif len(windows):
+            temp_pred[self.window_size - 1:] = models.temperature_predictor.predict(windows)
+            humidity_pred[self.window_size - 1:] = models.humidity_predictor.predict(windows)
+        INFERENCE_SECONDS.observe(time.perf_counter() - inference_started)
+
+        return {
+            "timestamp": columns["timestamp"],
+            "is_anomaly": scores < 0,
+            "anomaly_score": scores,
+            "temperature_prediction": temp_pred,
+            "humidity_prediction": humidity_pred,
+        }
+    
+    def check_training_data(self) -> Optional[Dict]:
+        """Return an error payload if there is not enough data to train, else None"""
+        if len(self.training_data) < MIN_TRAINING_SAMPLES:
             return {
                 "error": "Insufficient data", 
                 "samples": len(self.training_data),
-                "required": 100,
-                "message": f"At least 100 data points required for model training. Currently {len(self.training_data)} data points available. Wait on the dashboard to collect more data."
+                "required": MIN_TRAINING_SAMPLES,
+                "message": f"At least {MIN_TRAINING_SAMPLES} data points required for model training. Currently {len(self.training_data)} data points available. Wait on the dashboard to collect more data."
             }
+        return None
+
+    def training_snapshot(self) -> np.ndarray:
+        """Return an owned, ordered copy of the training buffer"""
+        return self.training_data.view().copy()
+
+    def install_models(self, bundle: ModelBundle) -> bool:
+        """Atomically swap in a trained bundle.
+
+        Bundles trained on an older snapshot than the installed one are
+        ignored so out-of-order job completion cannot roll the model back.
+        A saved bundle also becomes the published artifact version.
+        """
+        if self.models.is_trained and bundle.snapshot_count < self.models.snapshot_count:
+            return False
+        self.models = bundle
+        self.performance_metrics.update(bundle.metrics)
+        if bundle.version is not None:
+            self._publish(bundle.version)
+        return True
+
+    def train_models(self) -> Dict:
+        """Train models"""
+        error = self.check_training_data()
+        if error is not None:
+            return error
         
         try:
-            # Prepare data
-            X = np.array(self.training_data)
-
-            # Anomaly detection training
-            self.scaler.fit(X)
-            X_scaled = self.scaler.transform(X)
-            self.anomaly_detector.fit(X_scaled)
-            
-            # Sliding window approach for prediction models
-            if len(self.training_data) >= 20:  # More data required
-                # Sliding window: predict next value from last 5 data points
-                window_size = 5
-                X_windows = []
-                y_temp_windows = []
-                y_humidity_windows = []
-                
-                for i in range(window_size, len(self.training_data)):
-                    # Use last 5 data points as features
-                    window_features = []
-                    for j in range(i - window_size, i):
-                        window_features.extend(self.training_data[j])
-                    X_windows.append(window_features)
-                    y_temp_windows.append(self.training_data[i][0])  # Temperature
-                    y_humidity_windows.append(self.training_data[i][1])  # Humidity
-                
-                if len(X_windows) >= 5:  # At least 5 windows required
-                    X_windows = np.array(X_windows)
-                    y_temp_windows = np.array(y_temp_windows)
-                    y_humidity_windows = np.array(y_humidity_windows)
-                    
-                    # Train/test split
-                    X_train, X_test, y_temp_train, y_temp_test = train_test_split(
-                        X_windows, y_temp_windows, test_size=0.2, random_state=42
-                    )
-                    _, _, y_humidity_train, y_humidity_test = train_test_split(
-                        X_windows, y_humidity_windows, test_size=0.2, random_state=42
-                    )
-                    
-                    # Train models
-                    self.temperature_predictor.fit(X_train, y_temp_train)
-                    self.humidity_predictor.fit(X_train, y_humidity_train)
-                    
-                    # Save test performance
-                    self._temp_test_data = (X_test, y_temp_test)
-                    self._humidity_test_data = (X_test, y_humidity_test)
-            
-            # Performance evaluation
-            self._evaluate_models()
-            
-            self.is_trained = True
-            self.performance_metrics["last_training_time"] = time.time()
+            snapshot_count = self.training_data.total_appended
+            with TRAINING_SECONDS.time():
+                bundle = fit_models(self.training_data.view(), self.window_size)
+            bundle.snapshot_count = snapshot_count
+            self.install_models(bundle)
             
             # Save models
             self._save_models()
@@ -196,110 +759,181 @@ class SensorDataML:
         except Exception as e:
             return {"error": str(e), "samples": len(self.training_data)}
     
-    def _predict_temperature(self, features: List[float]) -> Optional[float]:
-        """Make temperature prediction - using sliding window"""
-        if not self.is_trained or len(self.training_data) < 5:
-            return None
-        try:
-            # Use last 5 data points
-            window_size = 5
-            recent_data = self.training_data[-window_size:]
-            window_features = []
-            for data_point in recent_data:
-                window_features.extend(data_point)
-            
-            return float(self.temperature_predictor.predict([window_features])[0])
-        except:
-            return None
-    
-    def _predict_humidity(self, features: List[float]) -> Optional[float]:
-        """Make humidity prediction - using sliding window"""
-        if not self.is_trained or len(self.training_data) < 5:
-            return None
-        try:
-            # Use last 5 data points
-            window_size = 5
-            recent_data = self.training_data[-window_size:]
-            window_features = []
-            for data_point in recent_data:
-                window_features.extend(data_point)
-            
-            return float(self.humidity_predictor.predict([window_features])[0])
-        except:
-            return None
-    
-    def _calculate_confidence(self) -> float:
-        """Calculate prediction confidence score"""
-        if not self.is_trained or len(self.training_data) < 5:
-            return 0.0
-        
+    def _confidence_for(self, n_samples: np.ndarray) -> np.ndarray:
+        """Confidence for each buffer size in `n_samples` (all at least window_size)"""
         # Simple confidence score: depends on data amount and model performance
-        data_confidence = min(1.0, len(self.training_data) / 100)
-        performance_confidence = (self.performance_metrics["temperature_prediction_r2"] + 
-                                self.performance_metrics["humidity_prediction_r2"]) / 2
+        data_confidence = np.minimum(1.0, n_samples / 100)
+        if self.forecast_engine == "online":
+            rolling = self.rolling_forecast_metrics()
+            performance_confidence = (rolling["temperature_rolling_r2"] + rolling["humidity_rolling_r2"]) / 2
+        else:
+            performance_confidence = (self.performance_metrics["temperature_prediction_r2"] + 
+                                    self.performance_metrics["humidity_prediction_r2"]) / 2
         
         return (data_confidence + performance_confidence) / 2
     
-    def _evaluate_models(self):
-        """Evaluate model performance"""
-        if len(self.training_data) < 10:
-            return
-        
-        X = np.array(self.training_data)
-
-        try:
-            X_scaled = self.scaler.transform(X)
-        except NotFittedError:
-            return
-
-        # Anomaly detection performance (simple heuristic)
-        anomaly_scores = self.anomaly_detector.decision_function(X_scaled)
-        anomaly_rate = np.mean(self.anomaly_detector.predict(X_scaled) == -1)
-        self.performance_metrics["anomaly_detection_accuracy"] = 1.0 - abs(anomaly_rate - 0.1)
-        
-        # Prediction performance - use test data if available
-        if hasattr(self, '_temp_test_data') and hasattr(self, '_humidity_test_data'):
-            X_test, y_temp_test = self._temp_test_data
-            _, y_humidity_test = self._humidity_test_data
-            
-            temp_pred = self.temperature_predictor.predict(X_test)
-            humidity_pred = self.humidity_predictor.predict(X_test)
-            
-            self.performance_metrics["temperature_prediction_r2"] = max(0, r2_score(y_temp_test, temp_pred))
-            self.performance_metrics["humidity_prediction_r2"] = max(0, r2_score(y_humidity_test, humidity_pred))
-        else:
-            # Fallback: simple evaluation
-            self.performance_metrics["temperature_prediction_r2"] = 0.0
-            self.performance_metrics["humidity_prediction_r2"] = 0.0
-    
-    def _save_models(self):
-        """Save models to file"""
+    def _save_models(self, bundle: Optional[ModelBundle] = None) -> Optional[int]:
+        """Save models as a new artifact version and publish it"""
+        bundle = bundle or self.models
         try:
-            joblib.dump(self.anomaly_detector, f"{self.model_dir}/anomaly_detector.pkl")
-            joblib.dump(self.temperature_predictor, f"{self.model_dir}/temperature_predictor.pkl")
-            joblib.dump(self.humidity_predictor, f"{self.model_dir}/humidity_predictor.pkl")
-            joblib.dump(self.scaler, f"{self.model_dir}/scaler.pkl")
+            version = save_bundle(bundle, self.model_dir, self.training_data.view(), self.window_size)
+            self._publish(version)
+            return version
         except Exception as e:
             print(f"Model saving error: {e}")
-    
-    def load_models(self):
-        """Load models from file"""
+            return None
+
+    def _publish(self, version: int):
+        artifacts.publish(self.model_dir, version)
+        artifacts.prune(self.model_dir, self.keep_versions)
+
+    def load_models(self, version: Optional[int] = None, restore_training_data: bool = True) -> bool:
+        """Load the published (or given) artifact version, memory-mapping its arrays
+
+        Falls back to the unversioned pickles written by older releases.
+        """
+        if version is None:
+            version = artifacts.current_version(self.model_dir)
+        if version is None:
+            return self._load_legacy_models()
+        try:
+            bundle, samples = load_bundle(self.model_dir, version)
+        except (OSError, ValueError, KeyError, EOFError):
+            return False
+        if restore_training_data and samples.ndim == 2 and samples.shape[1] == N_FEATURES:
+            self._restore_training_data(samples)
+        # Loaded models predate every snapshot taken from here on
+        bundle.snapshot_count = 0
+        self.models = bundle
+        self.performance_metrics.update(bundle.metrics)
+        return True
+
+    def _load_legacy_models(self) -> bool:
         try:
-            self.anomaly_detector = joblib.load(f"{self.model_dir}/anomaly_detector.pkl")
-            self.temperature_predictor = joblib.load(f"{self.model_dir}/temperature_predictor.pkl")
-            self.humidity_predictor = joblib.load(f"{self.model_dir}/humidity_predictor.pkl")
-            self.scaler = joblib.load(f"{self.model_dir}/scaler.pkl")
-            self.is_trained = True
+            bundle = ModelBundle(
+                scaler=joblib.load(f"{self.model_dir}/scaler.pkl"),
+                anomaly_detector=joblib.load(f"{self.model_dir}/anomaly_detector.pkl"),
+                temperature_predictor=joblib.load(f"{self.model_dir}/temperature_predictor.pkl"),
+                humidity_predictor=joblib.load(f"{self.model_dir}/humidity_predictor.pkl"),
+                is_trained=True,
+            )
+            self.models = bundle
             return True
         except:
             return False
+
+    def model_versions(self) -> Dict:
+        """Saved artifact versions, oldest first, and the one being served"""
+        versions = []
+        for version in artifacts.list_versions(self.model_dir):
+            try:
+                manifest = artifacts.read_manifest(self.model_dir, version)
+            except (OSError, ValueError):
+                continue
+            versions.append({
+                "version": version,
+                "created_at": manifest.get("created_at"),
+                "samples": manifest.get("samples"),
+                "metrics": manifest.get("metrics"),
+            })
+        return {
+            "current": artifacts.current_version(self.model_dir),
+            "loaded": self.models.version,
+            "versions": versions,
+        }
+
+    def rollback(self, version: Optional[int] = None) -> Optional[int]:
+        """Serve an earlier artifact version (default: the one before the current)
+
+        The training buffer is left alone. Returns the version now served, or
+        None if there is nothing to roll back to.
+        """
+        if version is None:
+            current = artifacts.current_version(self.model_dir)
+            older = [v for v in artifacts.list_versions(self.model_dir)
+                     if current is None or v < current]
+            if not older:
+                return None
+            version = older[-1]
+        if not self.load_models(version, restore_training_data=False):
+            return None
+        artifacts.publish(self.model_dir, version)
+        return version
+    
+    def save_training_data(self):
+        """Persist the training buffer next to the models"""
+        path = os.path.join(self.model_dir, "training_data.npy")
+        tmp = path + ".tmp.npy"
+        np.save(tmp, self.training_data.view())
+        os.replace(tmp, path)
+
+    def load_training_data(self) -> bool:
+        """Refill the training buffer from save_training_data output"""
+        try:
+            samples = np.load(os.path.join(self.model_dir, "training_data.npy"))
+        except (OSError, ValueError):
+            return False
+        if samples.ndim != 2 or samples.shape[1] != N_FEATURES:
+            return False
+        self._restore_training_data(samples)
+        return True
+
+    def _restore_training_data(self, samples: np.ndarray):
+        """Refill the training buffer; the live stream continues from its last rows"""
+        self.training_data.clear()
+        self.training_data.extend(samples[-self.max_training_samples:])
+        self.resume_stream()
+
+    def resume_stream(self):
+        """Continue the live stream from the newest rows of the training buffer"""
+        self.pipeline.reset(self.training_data.view())
+    
+    def configure(self, forecast_engine: Optional[str] = None, anomaly_engine: Optional[str] = None):
+        """Change runtime options; unknown engine names raise ValueError and change nothing"""
+        if forecast_engine is not None and forecast_engine not in FORECAST_ENGINES:
+            raise ValueError(f"unknown forecast engine: {forecast_engine}")
+        if anomaly_engine is not None and anomaly_engine not in ANOMALY_ENGINES:
+            raise ValueError(f"unknown anomaly engine: {anomaly_engine}")
+        if anomaly_engine is not None:
+            self.anomaly_engine = anomaly_engine
+        if forecast_engine is not None and forecast_engine != self.forecast_engine:
+            # Errors of the old engine say nothing about the new one
+            self.forecast_engine = forecast_engine
+            self.forecast_errors.clear()
+            self._pending_forecast = None
+
+    def rolling_forecast_metrics(self) -> Dict:
+        """MAE, RMSE and R² of the last ROLLING_ERROR_WINDOW served one-step forecasts"""
+        rows = self.forecast_errors.view()
+        metrics = {"rolling_error_samples": len(rows)}
+        for i, name in enumerate(("temperature", "humidity")):
+            if len(rows):
+                errors, actual = rows[:, i], rows[:, i + 2]
+                mse = float(np.mean(errors ** 2))
+                variance = float(np.var(actual))
+                r2 = max(0.0, 1.0 - mse / variance) if variance > 0 else 0.0
+                metrics[f"{name}_rolling_mae"] = float(np.mean(np.abs(errors)))
+                metrics[f"{name}_rolling_rmse"] = math.sqrt(mse)
+                metrics[f"{name}_rolling_r2"] = r2
+            else:
+                metrics[f"{name}_rolling_mae"] = None
+                metrics[f"{name}_rolling_rmse"] = None
+                metrics[f"{name}_rolling_r2"] = 0.0
+        return metrics
     
     def get_performance_metrics(self) -> Dict:
         """Return performance metrics"""
-        return self.performance_metrics.copy()
+        return {
+            **self.performance_metrics,
+            "forecast_engine": self.forecast_engine,
+            "anomaly_engine": self.anomaly_engine,
+            **self.rolling_forecast_metrics(),
+        }
     
-    def get_recent_anomalies(self, limit: int = 10) -> List[Dict]:
-        """Return recent anomaly detections"""
-        # In this simple implementation, we don't keep historical anomaly records
-        # In real application, it would be fetched from database
-        return []
+    def get_recent_anomalies(self, limit: int = 10, t_from: Optional[float] = None,
+                             t_to: Optional[float] = None) -> List[Dict]:
+        """Return recent anomaly detections, newest first"""
+        # Without a history store nothing outlives the in-memory buffer
+        if self.history is None:
+            return []
+        return self.history.anomalies(limit, t_from, t_to)
@@ -0,0 +1,178 @@
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+
+from ml_models import ModelBundle, SensorDataML
+
+# Device ids become directory names, so keep them to a safe alphabet
+DEVICE_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+
+# Approximate size of one sklearn tree node (the Node struct is 64 bytes)
+_TREE_NODE_BYTES = 64
+
+
+def validate_device_id(device_id: str) -> str:
+    if not isinstance(device_id, str) or not DEVICE_ID_PATTERN.match(device_id):
+        raise ValueError(f"invalid device_id: {device_id!r}")
+    return device_id
+
+
+def _estimator_nbytes(estimator) -> int:
+    """Rough in-memory size of a fitted tree ensemble or single tree"""
+    trees = getattr(estimator, "estimators_", None)
+    if trees is None:
+        trees = [estimator]
+    total = 0
+    for tree in trees:
+        tree_ = getattr(tree, "tree_", None)
+        if tree_ is not None:
+            total += tree_.node_count * _TREE_NODE_BYTES + tree_.value.nbytes
+    return total
+
+
+def bundle_nbytes(bundle: ModelBundle) -> int:
+    if not bundle.is_trained:
+        return 0
+    return (_estimator_nbytes(bundle.anomaly_detector)
+            + _estimator_nbytes(bundle.temperature_predictor)
+            + _estimator_nbytes(bundle.humidity_predictor))
+
+
+class _Entry:
+    def __init__(self, model: SensorDataML):
+        self.model = model
+        self.nbytes = 0
+        self._sized_bundle: Optional[ModelBundle] = None
+        self.mark_clean()
+
+    def mark_clean(self):
+        self.saved_bundle = self.model.models
+        self.saved_count = self.model.training_data.total_appended
+
+    @property
+    def dirty(self) -> bool:
+        return (self.model.models is not self.saved_bundle
+                or self.model.training_data.total_appended != self.saved_count)
+
+    def size(self) -> int:
+        # Trees only change when a new bundle is installed, so size once per bundle
+        if self.model.models is not self._sized_bundle:
+            self._sized_bundle = self.model.models
+            self.nbytes = self.model.training_data.nbytes + bundle_nbytes(self._sized_bundle)
+        return self.nbytes
+
+
+class ModelRegistry:
+    """Per-device SensorDataML instances with a memory-bounded LRU.
+
+    Models live under ``<model_dir>/<device_id>/`` and the published
+    artifact version is loaded on first use. At most ``max_models`` stay
+    in memory, and fewer when their estimated size passes ``max_bytes``.
+    The least recently used model is evicted first. On eviction its models
+    and training buffer are written back if they changed since they were
+    loaded or last saved.
+    """
+
+    def __init__(self, model_dir: str = "models/devices", max_models: int = 64,
+                 max_bytes: Optional[int] = None, **model_kwargs):
+        if max_models <= 0:
+            raise ValueError("max_models must be positive")
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.model_kwargs = model_kwargs
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def get(self, device_id: str) -> SensorDataML:
+        """Return the model for `device_id`, loading it from disk on a miss"""
+        entry = self._entries.get(device_id)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(device_id)
+            return entry.model
+
+        validate_device_id(device_id)
+        self.misses += 1
+        entry = _Entry(self._load(device_id))
+        self._entries[device_id] = entry
+        self._evict()
+        return entry.model
+
+    def peek(self, device_id: str) -> Optional[SensorDataML]:
+        """Return a hot model without loading, touching the LRU order or stats"""
+        entry = self._entries.get(device_id)
+        return entry.model if entry is not None else None
+
+    def _load(self, device_id: str) -> SensorDataML:
+        model = SensorDataML(model_dir=os.path.join(self.model_dir, device_id), **self.model_kwargs)
+        # The saved buffer is newer than the samples stored with the artifact;
+        # fall back to those only when it is missing, so one restore runs
+        if model.load_training_data():
+            model.load_models(restore_training_data=False)
+        else:
+            model.load_models()
+        return model
+
+    def _evict(self):
+        # Always keep the model that was just requested
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_models
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            _, entry = self._entries.popitem(last=False)
+            self._write_back(entry)
+            self.evictions += 1
+
+    def _write_back(self, entry: _Entry):
+        if not entry.dirty:
+            return
+        model = entry.model
+        # Bundles from training jobs were already saved by the worker
+        if model.models is not entry.saved_bundle and model.is_trained and model.models.version is None:
+            model._save_models()
+        model.save_training_data()
+        entry.mark_clean()
+        self.writebacks += 1
+
+    def configure(self, **settings):
+        """Apply SensorDataML.configure settings to hot models and future loads"""
+        for entry in self._entries.values():
+            entry.model.configure(**settings)
+        self.model_kwargs.update(settings)
+
+    def flush(self):
+        """Write back every dirty model without evicting it"""
+        for entry in self._entries.values():
+            self._write_back(entry)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry.size() for entry in self._entries.values())
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "models": len(self._entries),
+            "max_models": self.max_models,
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "writebacks": self.writebacks,
+            "dirty": sum(1 for entry in self._entries.values() if entry.dirty),
+        }
@@ -0,0 +1,78 @@
+import numpy as np
+from typing import Optional
+
+
+class RingBuffer:
+    """Fixed-capacity 2-D float64 ring buffer with O(1) append.
+
+    Every row is written twice, at ``i`` and ``i + capacity``, so the most
+    recent ``n`` rows are always one contiguous slice of the backing array.
+    ``view()`` therefore returns an ordered, zero-copy view without ever
+    rolling or concatenating.
+    """
+
+    def __init__(self, capacity: int, width: int, dtype=np.float64):
+        if capacity <= 0 or width <= 0:
+            raise ValueError("capacity and width must be positive")
+        self.capacity = capacity
+        self.width = width
+        self._data = np.zeros((2 * capacity, width), dtype=dtype)
+        self._count = 0  # total rows ever appended
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def total_appended(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def append(self, row):
+        """Append a single row in O(width)"""
+        pos = self._count % self.capacity
+        self._data[pos] = row
+        self._data[pos + self.capacity] = self._data[pos]
+        self._count += 1
+
+    def extend(self, rows):
+        """Append many rows with at most a few vectorized copies"""
+        rows = np.asarray(rows, dtype=self._data.dtype).reshape(-1, self.width)
+        n = len(rows)
+        if n == 0:
+            return
+        if n > self.capacity:
+            # Only the tail can survive; skip the rows that would be overwritten.
+            self._count += n - self.capacity
+            rows = rows[-self.capacity:]
+            n = self.capacity
+        pos = self._count % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = rows[:first]
+        self._data[pos + self.capacity:pos + self.capacity + first] = rows[:first]
+        if first < n:
+            rest = n - first
+            self._data[:rest] = rows[first:]
+            self._data[self.capacity:self.capacity + rest] = rows[first:]
+        self._count += n
+
+    def view(self, n: Optional[int] = None) -> np.ndarray:
+        """Return the last ``n`` rows (default: all) oldest-first, without copying"""
+        size = len(self)
+        n = size if n is None else min(n, size)
+        if n <= 0:
+            return self._data[:0]
+        end = (self._count - 1) % self.capacity + self.capacity + 1
+        return self._data[end - n:end]
+
+    def last(self) -> np.ndarray:
+        """Return the most recent row as a view"""
+        if self._count == 0:
+            raise IndexError("ring buffer is empty")
+        pos = (self._count - 1) % self.capacity
+        return self._data[pos]
+
+    def clear(self):
+        self._count = 0
@@ -0,0 +1,176 @@
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Numeric reading fields produced by generate_sensor_data_async
+ROLLUP_FIELDS = ("temperature", "humidity", "cpu_usage", "memory_usage", "network_speed", "signal_strength")
+
+# (bucket seconds, buckets retained): 10 s for a day, 1 min for a week, 1 h for a year
+DEFAULT_RESOLUTIONS = ((10, 8640), (60, 10080), (3600, 8760))
+
+
+class Rollup:
+    """Min/max/sum/count per field for fixed-width time buckets.
+
+    Buckets live in a ring indexed by ``bucket_id % capacity``; a slot is
+    reused as soon as a newer bucket maps onto it, which bounds memory to
+    the retention period.
+    """
+
+    def __init__(self, resolution: int, capacity: int, fields: Sequence[str] = ROLLUP_FIELDS):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        width = len(self.fields)
+        self.bucket_ids = np.full(capacity, -1, dtype=np.int64)
+        self.mins = np.full((capacity, width), np.inf)
+        self.maxs = np.full((capacity, width), -np.inf)
+        self.sums = np.zeros((capacity, width))
+        self.counts = np.zeros((capacity, width), dtype=np.int64)
+
+    @property
+    def retention(self) -> float:
+        return self.resolution * self.capacity
+
+    def add_batch(self, timestamps: np.ndarray, values: np.ndarray):
+        """Fold rows into their buckets; ``values`` is (n, len(fields)), NaN = missing"""
+        buckets = np.floor_divide(timestamps, self.resolution).astype(np.int64)
+        slots = buckets % self.capacity
+
+        # Recycle slots that still hold an older bucket
+        stale = buckets > self.bucket_ids[slots]
+        if stale.any():
+            np.maximum.at(self.bucket_ids, slots[stale], buckets[stale])
+            self._reset(np.unique(slots[stale]))
+
+        # Rows for buckets that have already been evicted are dropped
+        live = self.bucket_ids[slots] == buckets
+        slots, values = slots[live], values[live]
+        present = ~np.isnan(values)
+        np.minimum.at(self.mins, slots, np.where(present, values, np.inf))
+        np.maximum.at(self.maxs, slots, np.where(present, values, -np.inf))
+        np.add.at(self.sums, slots, np.where(present, values, 0.0))
+        np.add.at(self.counts, slots, present)
+
+    def _reset(self, recycle: np.ndarray):
+        self.mins[recycle] = np.inf
+        self.maxs[recycle] = -np.inf
+        self.sums[recycle] = 0
+        self.counts[recycle] = 0
+
+    def query(self, t_from: float, t_to: float, fields: Optional[List[str]] = None) -> Dict:
+        """Return the retained buckets overlapping [t_from, t_to], oldest first"""
+        fields = list(fields or self.fields)
+        cols = [self.fields.index(f) for f in fields]
+        first = int(t_from // self.resolution)
+        last = int(t_to // self.resolution)
+        first = max(first, last - self.capacity + 1)
+        wanted = np.arange(first, last + 1, dtype=np.int64) if last >= first else np.empty(0, np.int64)
+        slots = wanted % self.capacity
+        hit = self.bucket_ids[slots] == wanted
+        wanted, slots = wanted[hit], slots[hit]
+
+        counts = self.counts[slots][:, cols]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self.sums[slots][:, cols] / counts
+        empty = counts == 0
+        result = {"timestamp": (wanted * self.resolution).astype(np.float64)}
+        for k, field in enumerate(fields):
+            result[field] = {
+                "min": np.where(empty[:, k], np.nan, self.mins[slots, cols[k]]),
+                "max": np.where(empty[:, k], np.nan, self.maxs[slots, cols[k]]),
+                "mean": means[:, k],
+                "count": counts[:, k],
+            }
+        return result
+
+
+class RollupSet:
+    """Incremental rollups of the reading stream at several resolutions."""
+
+    def __init__(self, resolutions: Sequence[Tuple[int, int]] = DEFAULT_RESOLUTIONS,
+                 fields: Sequence[str] = ROLLUP_FIELDS):
+        self.fields = tuple(fields)
+        self.rollups = [Rollup(res, cap, self.fields) for res, cap in sorted(resolutions)]
+        self.watermark = -np.inf  # newest timestamp folded in so far
+
+    def add(self, record: Dict):
+        values = np.array([[np.nan if record.get(f) is None else record[f] for f in self.fields]])
+        self.add_batch(np.array([record["timestamp"]], dtype=np.float64), values)
+
+    def add_columns(self, columns: Dict[str, np.ndarray]):
+        """Fold in rows given as columns keyed by field name"""
+        timestamps = np.asarray(columns["timestamp"], dtype=np.float64)
+        values = np.column_stack([
+            np.asarray(columns[f], dtype=np.float64) if f in columns else np.full(len(timestamps), np.nan)
+            for f in self.fields
+        ])
+        self.add_batch(timestamps, values)
+
+    def add_batch(self, timestamps: np.ndarray, values: np.ndarray):
+        if not len(timestamps):
+            return
+        for rollup in self.rollups:
+            rollup.add_batch(timestamps, values)
+        self.watermark = max(self.watermark, float(timestamps.max()))
+
+    def get(self, resolution: int) -> Optional[Rollup]:
+        return next((r for r in self.rollups if r.resolution == resolution), None)
+
+    def choose(self, t_from: float, t_to: float, max_buckets: int, now: float) -> Optional[Rollup]:
+        """Finest rollup that still retains t_from and needs at most max_buckets buckets"""
+        for rollup in self.rollups:
+            if t_from >= now - rollup.retention and (t_to - t_from) / rollup.resolution <= max_buckets:
+                return rollup
+        # Nothing is fine enough to fit; fall back to the coarsest that retains the range
+        retained = [r for r in self.rollups if t_from >= now - r.retention]
+        return retained[-1] if retained else (self.rollups[-1] if self.rollups else None)
+
+    def rebuild(self, history, now: float, chunk_seconds: float = 86400):
+        """Replay stored history newer than the watermark, one chunk at a time"""
+        if not self.rollups:
+            return
+        start = max(self.watermark, now - max(r.retention for r in self.rollups))
+        while start <= now:
+            end = start + chunk_seconds
+            columns = history.query(start, end, ["timestamp", *self.fields])
+            if start == self.watermark:
+                # The watermark row itself is already folded in
+                keep = columns["timestamp"] > start
+                columns = {field: values[keep] for field, values in columns.items()}
+            self.add_columns(columns)
+            start = np.nextafter(end, np.inf)
+
+    def save(self, path: str):
+        """Write a snapshot atomically so restarts only replay newer history"""
+        arrays = {"watermark": np.array(self.watermark), "fields": np.array(self.fields)}
+        for r in self.rollups:
+            prefix = f"r{r.resolution}_"
+            arrays.update({prefix + "bucket_ids": r.bucket_ids, prefix + "mins": r.mins,
+                           prefix + "maxs": r.maxs, prefix + "sums": r.sums, prefix + "counts": r.counts})
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return False
+        with data:
+            if tuple(data["fields"].tolist()) != self.fields:
+                return False
+            for r in self.rollups:
+                prefix = f"r{r.resolution}_"
+                if prefix + "bucket_ids" not in data or len(data[prefix + "bucket_ids"]) != r.capacity:
+                    return False
+            for r in self.rollups:
+                prefix = f"r{r.resolution}_"
+                r.bucket_ids = data[prefix + "bucket_ids"]
+                r.mins = data[prefix + "mins"]
+                r.maxs = data[prefix + "maxs"]
+                r.sums = data[prefix + "sums"]
+                r.counts = data[prefix + "counts"]
+            self.watermark = float(data["watermark"])
+        return True
@@ -0,0 +1,292 @@
+"""Vectorized synthetic readings, and replay of recorded datasets.
+
+The batch generator uses the same signal model as the live generator in
+main.py, computed over NumPy arrays, so months of history for several
+devices take seconds. Run from backend/ to backfill:
+
+    python synthetic.py --count 2592000 --devices 4 --seed 1 --output month.npz
+    python synthetic.py --count 604800 --history history
+"""
+import argparse
+import json
+import math
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from history_store import DEVICE_STATUSES, HistoryStore
+
+# Signal strength at or above which a device reports each status, best first;
+# anything lower is "offline"
+SIGNAL_THRESHOLDS = ((70.0, "online"), (40.0, "warning"))
+# Reading "status" derived from device_status
+READING_STATUS = {"online": "active", "warning": "warning", "offline": "offline"}
+
+# Reading fields a generated or recorded dataset carries, besides "device"
+DATASET_FIELDS = ("timestamp", "temperature", "humidity", "cpu_usage", "memory_usage",
+                  "network_speed", "signal_strength", "device_status")
+
+# Ticks generated per batch; also the unit of seeding, so a seed reproduces
+# the same data for the same batch size
+BATCH_TICKS = 65536
+
+
+def device_status_for(signal_strength: float) -> str:
+    for threshold, status in SIGNAL_THRESHOLDS:
+        if signal_strength >= threshold:
+            return status
+    return "offline"
+
+
+def device_status_codes(signal_strength: np.ndarray) -> np.ndarray:
+    """Vectorized device_status_for, as indexes into DEVICE_STATUSES"""
+    codes = np.full(len(signal_strength), DEVICE_STATUSES.index("offline"), dtype=np.int8)
+    for threshold, status in reversed(SIGNAL_THRESHOLDS):
+        codes[signal_strength >= threshold] = DEVICE_STATUSES.index(status)
+    return codes
+
+
+def device_name(index: int) -> str:
+    return f"device-{index:04d}"
+
+
+def _batch(rng: np.random.Generator, timestamps: np.ndarray, devices: int,
+           phases: np.ndarray) -> Dict[str, np.ndarray]:
+    """One reading per device per timestamp, rows ordered by (timestamp, device)"""
+    n = len(timestamps) * devices
+    timestamp = np.repeat(timestamps, devices)
+    device = np.tile(np.arange(devices, dtype=np.int32), len(timestamps))
+    # Each device runs the same waveforms at its own phase
+    t = timestamp + phases[device]
+
+    temperature = 25 + 5 * np.sin(t / 10) + rng.uniform(-1, 1, n)
+    humidity = 60 + 20 * np.sin(t / 15) + rng.uniform(-5, 5, n)
+    # Stand-ins for the host telemetry the live generator reads
+    cpu_usage = np.clip(35 + 15 * np.sin(t / 120) + rng.normal(0, 4, n), 0, 100)
+    memory_usage = np.clip(55 + 5 * np.sin(t / 3600) + rng.normal(0, 1, n), 0, 100)
+
+    network_speed = np.maximum(0, 50 + 30 * np.sin(t / 5) + rng.uniform(-10, 10, n))
+    normalized_speed = np.clip(network_speed / 100, 0.0, 1.0)
+    signal_base = 60 + 20 * np.sin(t / 12) + rng.uniform(-8, 8, n)
+    signal_strength = np.clip(signal_base + (normalized_speed - 0.5) * 30, 0, 100)
+
+    return {
+        "timestamp": timestamp,
+        "device": device,
+        "temperature": np.round(temperature, 2),
+        "humidity": np.round(humidity, 2),
+        "cpu_usage": np.round(cpu_usage, 2),
+        "memory_usage": np.round(memory_usage, 2),
+        "network_speed": np.round(network_speed, 2),
+        "signal_strength": np.round(signal_strength, 2),
+        "device_status": device_status_codes(signal_strength),
+    }
+
+
+def iter_batches(count: int, devices: int = 1, seed: Optional[int] = None,
+                 start: Optional[float] = None, interval: float = 1.0,
+                 batch_ticks: int = BATCH_TICKS) -> Iterator[Dict[str, np.ndarray]]:
+    """Yield `count` ticks of readings for `devices` devices as column batches.
+
+    Every tick has one reading per device, so a batch holds up to
+    `batch_ticks * devices` rows in timestamp order. The default `start`
+    ends the series at the current time.
+    """
+    if count < 0 or devices <= 0:
+        raise ValueError("count must be non-negative and devices positive")
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2 ** 32)
+    if start is None:
+        start = time.time() - count * interval
+    phases = np.random.default_rng([seed, 2 ** 32]).uniform(0, 3600, devices)
+    phases[0] = 0.0  # the first device follows the live generator's clock
+    for index, first in enumerate(range(0, count, batch_ticks)):
+        ticks = np.arange(first, min(count, first + batch_ticks), dtype=np.float64)
+        rng = np.random.default_rng([seed, index])
+        yield _batch(rng, start + ticks * interval, devices, phases)
+
+
+def generate(count: int, devices: int = 1, seed: Optional[int] = None,
+             start: Optional[float] = None, interval: float = 1.0) -> Dict[str, np.ndarray]:
+    """All of iter_batches as one set of columns"""
+    batches = list(iter_batches(count, devices, seed, start, interval))
+    if not batches:
+        return {field: np.empty(0) for field in ("device",) + DATASET_FIELDS}
+    return {field: np.concatenate([b[field] for b in batches]) for field in batches[0]}
+
+
+def to_records(columns: Dict[str, np.ndarray], device_names: Optional[List[str]] = None) -> List[Dict]:
+    """Reading dicts as the live pipeline builds them (before ML analysis)"""
+    values = {field: columns[field].tolist() for field in DATASET_FIELDS}
+    devices = columns["device"].tolist() if device_names is not None and "device" in columns else None
+    records = []
+    for i, code in enumerate(values["device_status"]):
+        status = DEVICE_STATUSES[code] if 0 <= code < len(DEVICE_STATUSES) else None
+        record = {field: values[field][i] for field in DATASET_FIELDS}
+        record["device_status"] = status
+        record["status"] = READING_STATUS.get(status)
+        if devices is not None:
+            record["device_id"] = device_names[devices[i]]
+        records.append(record)
+    return records
+
+
+def write_npz(path: str, batches: Iterator[Dict[str, np.ndarray]], devices: int) -> int:
+    columns = {}
+    for batch in batches:
+        for field, values in batch.items():
+            columns.setdefault(field, []).append(values)
+    columns = {field: np.concatenate(parts) for field, parts in columns.items()}
+    np.savez(path, device_names=np.array([device_name(i) for i in range(devices)]), **columns)
+    return len(columns.get("timestamp", ()))
+
+
+def write_ndjson(path: str, batches: Iterator[Dict[str, np.ndarray]], devices: int) -> int:
+    """Write POST /ingest bodies: one JSON reading per line, with device_id"""
+    names = [device_name(i) for i in range(devices)]
+    rows = 0
+    with open(path, "w") as f:
+        for batch in batches:
+            f.writelines(json.dumps(r, separators=(",", ":")) + "\n" for r in to_records(batch, names))
+            rows += len(batch["timestamp"])
+    return rows
+
+
+def write_history(path: str, batches: Iterator[Dict[str, np.ndarray]]) -> int:
+    """Append readings to a HistoryStore, without ML results"""
+    store = HistoryStore(path)
+    rows = 0
+    try:
+        for batch in batches:
+            n = len(batch["timestamp"])
+            store.append_batch({
+                **{field: batch[field] for field in DATASET_FIELDS},
+                "is_anomaly": np.zeros(n, dtype=np.int8),
+                "anomaly_score": np.full(n, np.nan),
+                "temperature_prediction": np.full(n, np.nan),
+                "humidity_prediction": np.full(n, np.nan),
+            })
+            rows += n
+    finally:
+        store.close()
+    return rows
+
+
+def load_dataset(path: str) -> Dict[str, np.ndarray]:
+    """Columns of a dataset written by write_npz, or the readings of a HistoryStore directory.
+
+    Rows come back in timestamp order; "device_names" is present when the
+    dataset distinguishes devices.
+    """
+    if os.path.isdir(path):
+        store = HistoryStore(path)
+        try:
+            columns = store.query(-math.inf, math.inf, list(DATASET_FIELDS))
+        finally:
+            store.close()
+    else:
+        with np.load(path) as data:
+            columns = {field: data[field] for field in data.files}
+    order = np.argsort(columns["timestamp"], kind="stable")
+    if not np.array_equal(order, np.arange(len(order))):
+        columns = {field: (values[order] if field != "device_names" else values)
+                   for field, values in columns.items()}
+    return columns
+
+
+class Replay:
+    """Paces a recorded dataset against a clock, `speed` times faster than recorded.
+
+    due(elapsed) returns the readings whose recorded offset from the first
+    reading, divided by `speed`, has passed. With `loop` the dataset starts
+    over after the last reading.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], speed: float = 60.0, loop: bool = True):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        if not len(columns["timestamp"]):
+            raise ValueError("dataset is empty")
+        self.columns = columns
+        self.speed = speed
+        self.loop = loop
+        timestamps = columns["timestamp"]
+        self._offsets = (timestamps - timestamps[0]) / speed
+        # One recorded interval between the last reading and the next pass
+        gaps = np.diff(np.unique(timestamps))
+        self._period = self._offsets[-1] + (float(np.median(gaps)) if len(gaps) else 1.0) / speed
+        names = columns.get("device_names")
+        self.device_names = [str(n) for n in names] if names is not None and "device" in columns else None
+        self.position = 0
+        self.passes = 0
+        self.replayed = 0
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def finished(self) -> bool:
+        return not self.loop and self.position >= len(self)
+
+    def _clock(self, elapsed: float) -> float:
+        return elapsed - self.passes * self._period
+
+    def due(self, elapsed: float, limit: Optional[int] = None) -> List[Dict]:
+        """Readings due at `elapsed` seconds since replay started, at most `limit`"""
+        if self.position >= len(self) and self.loop and self._clock(elapsed) >= self._period:
+            self.position = 0
+            self.passes += 1
+        end = int(np.searchsorted(self._offsets, self._clock(elapsed), side="right"))
+        if limit is not None:
+            end = min(end, self.position + limit)
+        if end <= self.position:
+            return []
+        rows = {field: values[self.position:end] for field, values in self.columns.items()
+                if field != "device_names"}
+        self.position = end
+        self.replayed += len(rows["timestamp"])
+        return to_records(rows, self.device_names)
+
+    def delay(self, elapsed: float) -> float:
+        """Seconds until the next reading is due"""
+        if self.position < len(self):
+            return max(0.0, self._offsets[self.position] - self._clock(elapsed))
+        if self.loop:
+            return max(0.0, self._period - self._clock(elapsed))
+        return math.inf
+
+    def stats(self) -> Dict:
+        return {"readings": len(self), "position": self.position, "passes": self.passes,
+                "replayed": self.replayed, "speed": self.speed, "loop": self.loop}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, required=True, help="ticks to generate per device")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between ticks")
+    parser.add_argument("--start", type=float, default=None,
+                        help="first timestamp (epoch seconds); default ends the series now")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", help="dataset file: .npz (replayable) or .ndjson (for POST /ingest)")
+    target.add_argument("--history", help="HistoryStore directory to append to")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    batches = iter_batches(args.count, args.devices, args.seed, args.start, args.interval)
+    if args.history:
+        rows = write_history(args.history, batches)
+    elif args.output.endswith(".ndjson"):
+        rows = write_ndjson(args.output, batches, args.devices)
+    else:
+        rows = write_npz(args.output, batches, args.devices)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"rows": rows, "devices": args.devices, "seconds": round(elapsed, 3),
+                      "rows_per_second": round(rows / elapsed) if elapsed else None}))
+
+
+if __name__ == "__main__":
+    main()
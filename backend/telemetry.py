@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import psutil
+import structlog
+
+from ring_buffer import RingBuffer
+
+logger = structlog.get_logger()
+
+# Numeric series kept in the sampler history, one column each
+TELEMETRY_FIELDS = (
+    "timestamp",
+    "cpu_percent",
+    "memory_percent",
+    "disk_percent",
+    "disk_read_bytes_per_sec",
+    "disk_write_bytes_per_sec",
+    "net_sent_bytes_per_sec",
+    "net_recv_bytes_per_sec",
+)
+
+
+class TelemetrySampler:
+    """One background task that samples system telemetry at a fixed rate.
+
+    Readers get the latest snapshot, a plain dict that is replaced whole on
+    every sample, so reads are O(1) and never make syscalls. psutil's
+    cpu_percent(interval=None) measures the time since its previous call,
+    which is only meaningful with a single caller. Here that caller is the
+    sampler, so every value covers exactly one sampling interval.
+    """
+
+    def __init__(self, interval: float = 1.0, history_size: int = 300, disk_path: str = "/"):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.history = RingBuffer(history_size, len(TELEMETRY_FIELDS))
+        self.started_at = time.time()
+        # Static facts, read once
+        self.cpu_count = psutil.cpu_count()
+        self.memory_total = psutil.virtual_memory().total
+        self.snapshot: Dict = {}
+        self._previous: Optional[tuple] = None
+        self._task: Optional[asyncio.Task] = None
+        self.sample()  # prime cpu_percent and the I/O counters
+
+    def sample(self) -> Dict:
+        """Take one sample, publish it as the snapshot and append it to the history"""
+        now = time.time()
+        per_cpu = psutil.cpu_percent(percpu=True)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        disk_io = psutil.disk_io_counters()
+        net_io = psutil.net_io_counters()
+        counters = (
+            now,
+            disk_io.read_bytes if disk_io else 0,
+            disk_io.write_bytes if disk_io else 0,
+            net_io.bytes_sent if net_io else 0,
+            net_io.bytes_recv if net_io else 0,
+        )
+
+        rates = [0.0, 0.0, 0.0, 0.0]
+        if self._previous is not None:
+            elapsed = now - self._previous[0]
+            if elapsed > 0:
+                rates = [max(0.0, (c - p) / elapsed) for c, p in zip(counters[1:], self._previous[1:])]
+        self._previous = counters
+
+        cpu_percent = sum(per_cpu) / len(per_cpu) if per_cpu else 0.0
+        self.snapshot = {
+            "timestamp": now,
+            "cpu_percent": cpu_percent,
+            "cpu_percent_per_core": per_cpu,
+            "memory_percent": memory.percent,
+            "memory_used": memory.used,
+            "memory_available": memory.available,
+            "disk_percent": disk.percent,
+            "disk_read_bytes_per_sec": rates[0],
+            "disk_write_bytes_per_sec": rates[1],
+            "net_sent_bytes_per_sec": rates[2],
+            "net_recv_bytes_per_sec": rates[3],
+        }
+        self.history.append([now, cpu_percent, memory.percent, disk.percent, *rates])
+        return self.snapshot
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Fell behind; resync instead of sampling in a burst
+                next_tick, delay = loop.time(), 0
+            await asyncio.sleep(delay)
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning("telemetry_sample_failed", error=str(e))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def recent(self, seconds: Optional[float] = None) -> Dict[str, List[float]]:
+        """History columns, oldest first, optionally limited to the last `seconds`"""
+        rows = self.history.view()
+        if seconds is not None and len(rows):
+            rows = rows[rows[:, 0] >= rows[-1, 0] - seconds]
+        return {name: rows[:, i].tolist() for i, name in enumerate(TELEMETRY_FIELDS)}
+
+    @property
+    def uptime(self) -> float:
+        return time.time() - self.started_at
@@ -0,0 +1,52 @@
+import numpy as np
+
+from ml_models import FEATURE_INPUTS, FeaturePipeline, readings_to_columns
+from windowing import lag_matrix
+
+WINDOW = 4
+
+
+def _readings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    start = 1_700_000_000.0
+    return [dict({"timestamp": start + 37.0 * i},
+                 **{field: float(rng.uniform(0, 100)) for field in FEATURE_INPUTS})
+            for i in range(n)]
+
+
+def test_push_matches_push_batch_and_transform():
+    readings = _readings(25)
+    features, lags = FeaturePipeline.transform(readings_to_columns(readings), WINDOW)
+
+    single = FeaturePipeline(WINDOW)
+    pushed, windows = [], []
+    for i, reading in enumerate(readings):
+        row, series, history = single.push(reading)
+        assert history == min(i, WINDOW)
+        np.testing.assert_allclose(series, features[i - history:i + 1])
+        pushed.append(row[0].copy())  # row is a view into the ring buffer
+        if i >= WINDOW - 1:
+            windows.append(single.window()[0].copy())
+    np.testing.assert_allclose(pushed, features)
+    np.testing.assert_allclose(windows, lags)
+
+    batched = FeaturePipeline(WINDOW)
+    rows = []
+    for start, stop in [(0, 3), (3, 4), (4, 17), (17, 25)]:
+        chunk, series, history = batched.push_batch(readings_to_columns(readings[start:stop]))
+        assert history == min(start, WINDOW)
+        np.testing.assert_array_equal(series, features[start - history:stop])
+        rows.extend(chunk)
+    np.testing.assert_allclose(rows, features)
+    np.testing.assert_allclose(batched.window(), single.window())
+
+
+def test_reset_continues_the_stream_from_samples():
+    readings = _readings(12, seed=1)
+    features, _ = FeaturePipeline.transform(readings_to_columns(readings), WINDOW)
+
+    resumed = FeaturePipeline(WINDOW)
+    resumed.reset(features[:8])
+    for reading in readings[8:]:
+        resumed.push(reading)
+    np.testing.assert_allclose(resumed.window()[0], lag_matrix(features, WINDOW)[-1])
@@ -0,0 +1,43 @@
+import numpy as np
+
+from history_store import HISTORY_FIELDS, HistoryStore
+
+
+def _store(path, timestamps, anomalous):
+    store = HistoryStore(str(path), segment_rows=1000)
+    n = len(timestamps)
+    columns = {field: np.zeros(n, dtype=dtype) for field, dtype in HISTORY_FIELDS.items()}
+    columns["timestamp"] = np.asarray(timestamps, dtype=np.float64)
+    columns["is_anomaly"] = np.asarray(anomalous, dtype=np.int8)
+    store.append_batch(columns)
+    return store
+
+
+def test_ranged_anomalies_match_a_full_scan(tmp_path):
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(5000, dtype=np.float64)
+    timestamps[2000:2500] = rng.permutation(timestamps[2000:2500])  # an unsorted stretch
+    anomalous = rng.random(5000) < 0.3
+    store = _store(tmp_path, timestamps, anomalous)
+    try:
+        for t_from, t_to, limit in [(100, 4000, 10), (2100, 2400, 50), (0, 5000, 2000), (4999.5, 6000, 5)]:
+            # Newest first means by row, whatever the timestamps' order
+            rows = np.flatnonzero(anomalous & (timestamps >= t_from) & (timestamps <= t_to))
+            expected = timestamps[rows][::-1][:limit].tolist()
+            found = [r["timestamp"] for r in store.anomalies(limit, t_from, t_to)]
+            assert found == expected
+    finally:
+        store.close()
+
+
+def test_ranged_anomalies_read_only_the_tail(tmp_path, monkeypatch):
+    timestamps = np.arange(5000, dtype=np.float64)
+    store = _store(tmp_path, timestamps, np.ones(5000))
+    gathered = []
+    rows_by_id = store._rows_by_id
+    monkeypatch.setattr(store, "_rows_by_id", lambda ids, fields: gathered.append(len(ids)) or rows_by_id(ids, fields))
+    try:
+        assert len(store.anomalies(10, 0, 5000)) == 10
+        assert max(gathered) <= 256
+    finally:
+        store.close()
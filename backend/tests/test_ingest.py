@@ -0,0 +1,29 @@
+import json
+
+from history_store import DEVICE_STATUSES
+from ingest import device_groups, parse_ndjson_lines
+
+
+def _line(**fields) -> bytes:
+    reading = {"timestamp": 1.0, "temperature": 20.0, "humidity": 50.0, "cpu_usage": 10.0,
+               "memory_usage": 20.0, "network_speed": 30.0, "signal_strength": 80.0}
+    reading.update(fields)
+    return json.dumps(reading).encode()
+
+
+def test_non_string_device_id_is_rejected():
+    lines = [_line(device_id="a"), _line(device_id=[1]), _line(device_id={"x": 1}), _line(device_id=3), _line()]
+    columns, records, rejected = parse_ndjson_lines(lines)
+    assert rejected == 3
+    assert len(columns["timestamp"]) == 2
+    groups = device_groups(records)
+    assert set(groups) == {"a", None}
+
+
+def test_unhashable_device_status_falls_back_to_signal():
+    lines = [_line(device_status={}), _line(device_status=[]), _line(device_status="offline")]
+    columns, _, rejected = parse_ndjson_lines(lines)
+    assert rejected == 0
+    assert columns["device_status"].tolist() == [DEVICE_STATUSES.index("online"),
+                                                 DEVICE_STATUSES.index("online"),
+                                                 DEVICE_STATUSES.index("offline")]
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from ring_buffer import RingBuffer
+
+
+def _rows(start, stop, width=3):
+    return np.arange(start * width, stop * width, dtype=np.float64).reshape(-1, width)
+
+
+def test_view_is_ordered_across_wraparound():
+    buf = RingBuffer(capacity=5, width=3)
+    expected = _rows(0, 13)
+    for row in expected:
+        buf.append(row)
+    assert len(buf) == 5
+    assert buf.total_appended == 13
+    np.testing.assert_array_equal(buf.view(), expected[-5:])
+    np.testing.assert_array_equal(buf.view(2), expected[-2:])
+    np.testing.assert_array_equal(buf.last(), expected[-1])
+
+
+def test_view_is_a_contiguous_view_of_the_backing_array():
+    buf = RingBuffer(capacity=4, width=3)
+    buf.extend(_rows(0, 7))  # ends mid-way through the second lap
+    view = buf.view()
+    assert view.flags["C_CONTIGUOUS"]
+    assert np.shares_memory(view, buf._data)  # no copy was handed out
+    np.testing.assert_array_equal(view, _rows(3, 7))
+
+
+@pytest.mark.parametrize("chunks", [[3, 3, 3], [2, 7], [11], [0, 4, 1, 6]])
+def test_extend_matches_appending_row_by_row(chunks):
+    rows = _rows(0, sum(chunks))
+    extended, appended = RingBuffer(capacity=4, width=3), RingBuffer(capacity=4, width=3)
+    start = 0
+    for size in chunks:
+        extended.extend(rows[start:start + size])
+        start += size
+    for row in rows:
+        appended.append(row)
+    assert extended.total_appended == appended.total_appended == len(rows)
+    np.testing.assert_array_equal(extended.view(), appended.view())
+    np.testing.assert_array_equal(extended.view(), rows[-4:])
+
+
+def test_empty_buffer():
+    buf = RingBuffer(capacity=3, width=2)
+    assert buf.view().shape == (0, 2)
+    with pytest.raises(IndexError):
+        buf.last()
+    buf.extend(_rows(0, 2, width=2))
+    buf.clear()
+    assert len(buf) == 0 and buf.view(5).shape == (0, 2)
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from benchmarks.fake_open_meteo import FakeOpenMeteo
+from weather import CircuitBreaker, WeatherCache
+
+
+def test_cancelled_half_open_trial_releases_the_breaker():
+    async def scenario():
+        with FakeOpenMeteo(delay=1.0) as fake:
+            breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+            breaker.record_failure()
+            cache = WeatherCache(base_url=fake.url, breaker=breaker)
+            task = asyncio.get_running_loop().create_task(cache.get(41.0, 29.0))
+            await asyncio.sleep(0.2)  # the trial call is in flight
+            for entry in cache._entries.values():
+                entry.task.cancel()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.sleep(0)
+            assert breaker.state == "half_open"
+            assert breaker.allow()
+            await cache.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_stale_value_is_served_while_the_refresh_runs():
+    async def scenario():
+        with FakeOpenMeteo(delay=0.3) as fake:
+            cache = WeatherCache(base_url=fake.url, ttl=0.1, refresh_ahead=0.5)
+            assert await cache.get(41.0, 29.0) == (18.5, 62.0)  # the miss waits for upstream
+            await asyncio.sleep(0.15)  # now past ttl
+            fake.payload = fake.payload.replace(b"18.5", b"21.0")
+
+            started = time.monotonic()
+            assert await cache.get(41.0, 29.0) == (18.5, 62.0)
+            assert time.monotonic() - started < fake.delay
+            assert await cache.get(41.0, 29.0) == (18.5, 62.0)  # the refresh is shared
+            await asyncio.sleep(0.5)
+            assert await cache.get(41.0, 29.0) == (21.0, 62.0)
+            assert fake.requests == 2
+            await cache.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    async def scenario():
+        dead = FakeOpenMeteo()
+        dead_url = dead.url
+        dead.server.server_close()  # nothing listens there any more
+        with FakeOpenMeteo() as fake:
+            breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+            cache = WeatherCache(base_url=dead_url, timeout=1.0, breaker=breaker)
+            for _ in range(2):
+                assert await cache.get(41.0, 29.0) == (None, None)
+            assert breaker.state == "open"
+
+            cache.base_url = fake.url
+            assert await cache.get(41.0, 29.0) == (None, None)  # short-circuited
+            assert fake.requests == 0
+
+            await asyncio.sleep(0.2)
+            assert breaker.state == "half_open"
+            assert await cache.get(41.0, 29.0) == (18.5, 62.0)
+            assert fake.requests == 1
+            assert breaker.state == "closed"
+            await cache.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_failed_half_open_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.0)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial at a time
+    breaker.reset_timeout = 30.0
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
@@ -0,0 +1,31 @@
+import struct
+
+from ws_protocol import BINARY_HEADER, QUANTIZED_MISSING, FrameCache, WsOptions
+
+
+def _reading(timestamp: float, network_speed: float) -> dict:
+    return {"timestamp": timestamp, "temperature": 20.0, "humidity": 50.0, "network_speed": network_speed}
+
+
+def _values(frame: bytes, n_fields: int):
+    return struct.unpack(f"<{n_fields}i", frame[BINARY_HEADER.size:])
+
+
+def test_quantized_value_out_of_int32_range_is_sent_as_missing():
+    options = WsOptions({"format": "binary", "precision": "4",
+                         "fields": "temperature,network_speed"}, 1.0)
+    cache = FrameCache()
+    frame = cache.get(options, cache.publish(_reading(1.0, 500000.0)), keyframe=True)
+    assert _values(frame, 2) == (200000, QUANTIZED_MISSING)
+
+
+def test_quantized_delta_overflow_falls_back_to_keyframe():
+    options = WsOptions({"format": "binary", "precision": "4", "encoding": "delta",
+                         "fields": "temperature,network_speed"}, 1.0)
+    cache = FrameCache()
+    cache.get(options, cache.publish(_reading(1.0, -200000.0)), keyframe=True)
+    frame = cache.get(options, cache.publish(_reading(2.0, 200000.0)), keyframe=False)
+    flags = BINARY_HEADER.unpack_from(frame)[0]
+    assert flags & 1
+    mask_size = 1
+    assert struct.unpack("<2i", frame[BINARY_HEADER.size + mask_size:]) == (200000, 2000000000)
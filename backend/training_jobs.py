@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from ml_models import TRAINING_SECONDS, ModelBundle, SensorDataML, fit_models, save_bundle
+
+
+def _run_training(job_id: str, progress, samples: np.ndarray, window_size: int,
+                  model_dir: str) -> ModelBundle:
+    """Worker-process entry point: fit on the snapshot and persist the result"""
+    def report(stage: str, fraction: float):
+        progress[job_id] = (stage, fraction)
+
+    bundle = fit_models(samples, window_size, progress=report)
+    save_bundle(bundle, model_dir, samples, window_size)
+    return bundle
+
+
+class TrainingJob:
+    def __init__(self, job_id: str, samples: int, snapshot_count: int):
+        self.id = job_id
+        self.status = "queued"  # queued -> running -> succeeded | failed
+        self.stage = "queued"
+        self.progress = 0.0
+        self.samples = samples
+        self.snapshot_count = snapshot_count
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.installed = False
+        self.error: Optional[str] = None
+        self.performance: Optional[Dict] = None
+        self.version: Optional[int] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "samples_used": self.samples,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "installed": self.installed,
+            "error": self.error,
+            "performance": self.performance,
+            "version": self.version,
+        }
+
+
+class TrainingJobManager:
+    """Run train_models in a process pool and hot-swap the result.
+
+    Training works on an owned copy of the buffer, so the event loop keeps
+    serving /ws and /data while trees are fitted. The worker saves the
+    bundle as a new artifact version; it is installed on the event loop
+    thread with SensorDataML.install_models, a single reference swap that
+    also publishes the version. Pass `current` when the model may be
+    replaced while the job runs (e.g. evicted from a ModelRegistry); the
+    bundle is installed on whatever it returns at completion.
+    """
+
+    def __init__(self, max_workers: int = 1, max_jobs: int = 100):
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, TrainingJob] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._progress = None
+        self._tasks = set()
+
+    def _ensure_started(self):
+        if self._executor is None:
+            ctx = multiprocessing.get_context("spawn")
+            self._manager = ctx.Manager()
+            self._progress = self._manager.dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx)
+
+    def submit(self, model: SensorDataML,
+               current: Optional[Callable[[], SensorDataML]] = None) -> TrainingJob:
+        self._ensure_started()
+        job = TrainingJob(uuid.uuid4().hex, len(model.training_data),
+                          model.training_data.total_appended)
+        self.jobs[job.id] = job
+        self._trim()
+        task = asyncio.get_running_loop().create_task(
+            self._run(job, model, model.training_snapshot(), current))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: TrainingJob, model: SensorDataML, samples: np.ndarray,
+                   current: Optional[Callable[[], SensorDataML]]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        future = loop.run_in_executor(self._executor, _run_training, job.id, self._progress,
+                                      samples, model.window_size, model.model_dir)
+        try:
+            bundle = await future
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        else:
+            TRAINING_SECONDS.observe(time.perf_counter() - started)
+            bundle.snapshot_count = job.snapshot_count
+            job.version = bundle.version
+            if current is not None:
+                model = current()
+            job.installed = model.install_models(bundle)
+            job.status = "succeeded"
+            job.stage, job.progress = "done", 1.0
+            job.performance = model.get_performance_metrics()
+        finally:
+            job.finished_at = time.time()
+            await self._call_progress("pop", job.id, None)
+
+    async def _call_progress(self, method: str, *args):
+        """Call the Manager dict off the event loop; every call is an IPC round trip"""
+        progress = self._progress
+        if progress is None:
+            return None
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, getattr(progress, method), *args)
+        except (OSError, EOFError):
+            return None  # the manager is gone (shutdown)
+
+    async def get(self, job_id: str) -> Optional[TrainingJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and job.finished_at is None:
+            reported = await self._call_progress("get", job.id)
+            if reported is not None and job.finished_at is None:
+                job.status = "running"
+                job.stage, job.progress = reported
+        return job
+
+    def _trim(self):
+        # Forget the oldest finished jobs once the history is full
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        for job in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job.id]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._executor = None
@@ -0,0 +1,190 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+import structlog
+
+from metrics import Counter
+
+logger = structlog.get_logger()
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+WEATHER_LOOKUPS = Counter("weather_cache_lookups_total", "Weather cache lookups", ["result"])
+WEATHER_REFRESHES = Counter("weather_refreshes_total", "Upstream weather refresh attempts", ["result"])
+
+Weather = Tuple[Optional[float], Optional[float]]
+
+
+class CircuitBreaker:
+    """Stop calling a failing upstream for a while.
+
+    closed: calls go through. After `failure_threshold` consecutive failures
+    the breaker opens and calls are skipped for `reset_timeout` seconds.
+    After that one trial call is let through (half-open), which either
+    closes the breaker or opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def end_trial(self):
+        """Let another trial through after a call that recorded no outcome (e.g. was cancelled)"""
+        self._trial_running = False
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at", "task")
+
+    def __init__(self):
+        self.value: Optional[Weather] = None
+        self.fetched_at = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+
+class WeatherCache:
+    """Current temperature/humidity per location, refreshed in the background.
+
+    Locations are keyed by (lat, lon) rounded to 3 decimals (about 100 m)
+    and the least recently used is dropped beyond `max_locations`. Once a
+    value is older than `refresh_ahead * ttl` a background refresh starts
+    and callers keep getting the cached value, even past `ttl`, until the
+    refresh lands. Only the first lookup of a location waits for upstream.
+    One pooled httpx client is reused for every request.
+    """
+
+    def __init__(self, base_url: str = OPEN_METEO_URL, ttl: float = 60.0, refresh_ahead: float = 0.8,
+                 max_locations: int = 256, timeout: float = 5.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.max_locations = max_locations
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._entries: "OrderedDict[Tuple[float, float], _Entry]" = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        return self._client
+
+    @staticmethod
+    def key(lat: float, lon: float) -> Tuple[float, float]:
+        return round(float(lat), 3), round(float(lon), 3)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, lat: float, lon: float) -> Weather:
+        """Return (temperature, humidity) for a location, (None, None) if unknown"""
+        key = self.key(lat, lon)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+            while len(self._entries) > self.max_locations:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+
+        if entry.value is None:
+            WEATHER_LOOKUPS.inc(result="miss")
+            # Nothing to serve yet: wait for the (shared) refresh
+            await asyncio.shield(self._schedule(key, entry))
+            return entry.value or (None, None)
+
+        age = time.monotonic() - entry.fetched_at
+        if age >= self.refresh_ahead * self.ttl:
+            self._schedule(key, entry)
+        WEATHER_LOOKUPS.inc(result="hit" if age < self.ttl else "stale")
+        return entry.value
+
+    def _schedule(self, key: Tuple[float, float], entry: _Entry) -> asyncio.Task:
+        """Start a refresh for `key` unless one is already running"""
+        if entry.task is None or entry.task.done():
+            entry.task = asyncio.get_running_loop().create_task(self._refresh(key, entry))
+        return entry.task
+
+    async def _refresh(self, key: Tuple[float, float], entry: _Entry):
+        if not self.breaker.allow():
+            WEATHER_REFRESHES.inc(result="short_circuited")
+            return
+        lat, lon = key
+        try:
+            resp = await self.client.get(self.base_url, params={
+                "latitude": lat,
+                "longitude": lon,
+                "current": "temperature_2m,relative_humidity_2m",
+            })
+            resp.raise_for_status()
+            current = resp.json().get("current", {})
+            value = (current.get("temperature_2m"), current.get("relative_humidity_2m"))
+        except Exception as e:
+            self.breaker.record_failure()
+            WEATHER_REFRESHES.inc(result="failure")
+            logger.warning("weather_fetch_failed", error=str(e), lat=lat, lon=lon,
+                           breaker=self.breaker.state)
+            return
+        finally:
+            # Cancellation skips both record_* calls; never leave a half-open trial pending
+            self.breaker.end_trial()
+        self.breaker.record_success()
+        WEATHER_REFRESHES.inc(result="success")
+        entry.value = value
+        entry.fetched_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            "locations": len(self._entries),
+            "max_locations": self.max_locations,
+            "ttl": self.ttl,
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+    async def aclose(self):
+        for entry in self._entries.values():
+            if entry.task is not None:
+                entry.task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,33 @@
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from typing import Tuple
+
+
+def lag_matrix(samples: np.ndarray, window: int) -> np.ndarray:
+    """Build the lag matrix of ``samples`` as a read-only strided view.
+
+    Row ``i`` is rows ``i .. i + window - 1`` of ``samples`` flattened, i.e.
+    the same layout the old nested ``extend`` loop produced. Because the
+    samples are C-contiguous, each window is already a contiguous run of
+    ``window * width`` floats, so no data is copied.
+    """
+    samples = np.ascontiguousarray(samples)
+    n, width = samples.shape
+    rows = n - window + 1
+    if rows <= 0:
+        return np.empty((0, window * width), dtype=samples.dtype)
+    return as_strided(
+        samples,
+        shape=(rows, window * width),
+        strides=(samples.strides[0], samples.strides[1]),
+        writeable=False,
+    )
+
+
+def training_pairs(samples: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(X, Y)`` where ``X[i]`` is a lag window and ``Y[i]`` the sample after it"""
+    if len(samples) <= window:
+        width = samples.shape[1]
+        return np.empty((0, window * width)), np.empty((0, width))
+    return lag_matrix(samples[:-1], window), samples[window:]
+
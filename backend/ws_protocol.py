@@ -0,0 +1,255 @@
+import json
+import math
+import struct
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # optional: format=msgpack is refused without it
+    msgpack = None
+
+from history_store import DEVICE_STATUSES
+
+# Fields of a /ws reading, in frame order
+WS_FIELDS = (
+    "timestamp", "temperature", "humidity", "cpu_usage", "memory_usage", "network_speed",
+    "signal_strength", "device_status", "status", "is_anomaly", "anomaly_score",
+    "temperature_prediction", "humidity_prediction", "prediction_confidence",
+)
+# Binary frames carry the timestamp in the header and numbers only; "status" is
+# derived from device_status, which travels as its index in DEVICE_STATUSES
+BINARY_FIELDS = tuple(f for f in WS_FIELDS if f not in ("timestamp", "status"))
+FORMATS = ("json", "msgpack", "binary")
+ENCODINGS = ("full", "delta")
+MAX_PRECISION = 4
+# Delta streams send a keyframe at least this often (in frames of that stream)
+KEYFRAME_INTERVAL = 60
+
+# flags (bit 0: keyframe), sequence number, reading timestamp
+BINARY_HEADER = struct.Struct("<BId")
+QUANTIZED_MISSING = -2 ** 31  # int32 sentinel for a missing value
+QUANTIZED_LIMIT = 2 ** 31  # quantized magnitudes from here on do not fit an int32
+
+Frame = Union[str, bytes]
+
+
+class WsOptions:
+    """Per-connection protocol choice, negotiated from /ws query parameters.
+
+    format=json|msgpack|binary, fields=a,b,c, rate=<max frames/s>,
+    encoding=full|delta and precision=<decimals> (quantization). A
+    connection without parameters gets the original JSON frames.
+    """
+
+    def __init__(self, params: Mapping[str, str], stream_interval: float):
+        self.legacy = not any(name in params for name in ("format", "fields", "rate", "encoding", "precision"))
+        self.format = params.get("format", "json")
+        if self.format not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        if self.format == "msgpack" and msgpack is None:
+            raise ValueError("msgpack is not installed on the server")
+        self.encoding = params.get("encoding", "full")
+        if self.encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {', '.join(ENCODINGS)}")
+
+        available = BINARY_FIELDS if self.format == "binary" else WS_FIELDS
+        if params.get("fields"):
+            fields = [f.strip() for f in params["fields"].split(",") if f.strip()]
+            unknown = [f for f in fields if f not in available]
+            if unknown:
+                raise ValueError(f"unknown fields for {self.format}: {', '.join(unknown)}")
+            # Keep frame order stable whatever order the client listed them in
+            self.fields = tuple(f for f in available if f in fields)
+        else:
+            self.fields = available
+        if self.format != "binary" and "timestamp" not in self.fields:
+            self.fields = ("timestamp",) + self.fields
+
+        precision = params.get("precision")
+        self.precision: Optional[int] = None
+        if precision is not None:
+            self.precision = int(precision)
+            if not 0 <= self.precision <= MAX_PRECISION:
+                raise ValueError(f"precision must be between 0 and {MAX_PRECISION}")
+
+        # Send every `divisor`-th tick so the rate never exceeds the one asked for
+        self.divisor = 1
+        if params.get("rate"):
+            rate = float(params["rate"])
+            if rate <= 0:
+                raise ValueError("rate must be positive")
+            self.divisor = max(1, math.ceil(1.0 / (rate * stream_interval) - 1e-9))
+        self.interval = self.divisor * stream_interval
+
+        # Connections with equal keys share every serialized frame
+        self.key = (self.legacy, self.format, self.fields, self.encoding, self.precision, self.divisor)
+
+    def hello(self) -> Dict:
+        """Description of the negotiated stream, sent as the first (text) message"""
+        hello = {
+            "type": "hello",
+            "format": self.format,
+            "fields": list(self.fields),
+            "encoding": self.encoding,
+            "precision": self.precision,
+            "interval": self.interval,
+            "device_status_codes": list(DEVICE_STATUSES),
+            "keyframe_interval": KEYFRAME_INTERVAL if self.encoding == "delta" else None,
+        }
+        if self.format == "binary":
+            hello["layout"] = {
+                "header": "<BId (flags: bit 0 keyframe, sequence, timestamp)",
+                "mask": "ceil(len(fields)/8) bytes, bit i = field i present (delta encoding only)",
+                "value": "<f8" if self.precision is None else "<i4 (value * 10**precision)",
+                "delta_value": ("absolute <f8" if self.precision is None
+                                else "<i4 difference from the previous frame"),
+                # Quantized values too large for an int32 are sent as missing
+                "missing": "NaN" if self.precision is None else QUANTIZED_MISSING,
+            }
+        return hello
+
+
+class Tick:
+    """One published reading, its position in the stream and when it was produced"""
+
+    __slots__ = ("seq", "data", "produced_at")
+
+    def __init__(self, seq: int, data: Dict, produced_at: Optional[float] = None):
+        self.seq = seq
+        self.data = data
+        self.produced_at = data["timestamp"] if produced_at is None else produced_at
+
+
+class FrameCache:
+    """Serialize each tick once per negotiated encoding.
+
+    Delta frames are a pure function of a tick and the tick `divisor`
+    steps before it, so any connection can fetch any recent frame. A
+    connection that missed frames (a dropped slot in its send queue) asks
+    for a keyframe instead, which is cached too.
+    """
+
+    def __init__(self, history: int = 64, max_frames: int = 512):
+        self._ticks: "OrderedDict[int, Tick]" = OrderedDict()
+        self._history = history
+        self._frames: "OrderedDict[Tuple, Frame]" = OrderedDict()
+        self._max_frames = max_frames
+        self._seq = 0
+        self.encoded = 0
+        self.reused = 0
+
+    def publish(self, data: Dict, produced_at: Optional[float] = None, seq: Optional[int] = None) -> Tick:
+        """Add a tick; `seq` continues a sequence numbered elsewhere (e.g. by another process)"""
+        self._seq = self._seq + 1 if seq is None else seq
+        tick = Tick(self._seq, data, produced_at)
+        self._ticks[tick.seq] = tick
+        while len(self._ticks) > self._history:
+            self._ticks.popitem(last=False)
+        return tick
+
+    def get(self, options: WsOptions, tick: Tick, keyframe: bool) -> Frame:
+        previous = None
+        if options.encoding == "delta" and not keyframe:
+            previous = self._ticks.get(tick.seq - options.divisor)
+        keyframe = keyframe or options.encoding == "full" or previous is None
+        cache_key = (options.key, tick.seq, keyframe)
+        frame = self._frames.get(cache_key)
+        if frame is not None:
+            self.reused += 1
+            return frame
+        frame = encode(options, tick, None if keyframe else previous)
+        self.encoded += 1
+        self._frames[cache_key] = frame
+        while len(self._frames) > self._max_frames:
+            self._frames.popitem(last=False)
+        return frame
+
+
+def _quantize(value: Any, precision: Optional[int]) -> Any:
+    if precision is None or not isinstance(value, float):
+        return value
+    return round(value, precision)
+
+
+def _numeric(field: str, value: Any) -> float:
+    if value is None:
+        return math.nan
+    if field == "device_status":
+        return float(DEVICE_STATUSES.index(value)) if value in DEVICE_STATUSES else -1.0
+    return float(value)
+
+
+def encode(options: WsOptions, tick: Tick, previous: Optional[Tick]) -> Frame:
+    """Serialize `tick`; a delta against `previous` when given, else a keyframe"""
+    data = tick.data
+    if options.legacy:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    if options.format == "binary":
+        return _encode_binary(options, tick, previous)
+
+    values = {f: _quantize(data.get(f), options.precision) for f in options.fields}
+    if options.encoding == "delta":
+        if previous is not None:
+            before = previous.data
+            values = {f: v for f, v in values.items()
+                      if f == "timestamp" or v != _quantize(before.get(f), options.precision)}
+        values = {"seq": tick.seq, "key": previous is None, **values}
+    if options.format == "msgpack":
+        return msgpack.packb(values)
+    return json.dumps(values, separators=(",", ":"), ensure_ascii=False)
+
+
+def _encode_binary(options: WsOptions, tick: Tick, previous: Optional[Tick]) -> bytes:
+    fields = options.fields
+    current = [_numeric(f, tick.data.get(f)) for f in fields]
+    header = BINARY_HEADER.pack(1 if previous is None else 0, tick.seq & 0xFFFFFFFF,
+                                float(tick.data["timestamp"]))
+
+    if options.precision is None:
+        if options.encoding == "full":
+            return header + struct.pack(f"<{len(fields)}d", *current)
+        if previous is None:
+            present = list(range(len(fields)))
+        else:
+            before = [_numeric(f, previous.data.get(f)) for f in fields]
+            # NaN != NaN, so compare "both missing" explicitly
+            present = [i for i, (a, b) in enumerate(zip(current, before))
+                       if a != b and not (math.isnan(a) and math.isnan(b))]
+        values = [current[i] for i in present]
+        return header + _mask(len(fields), present) + struct.pack(f"<{len(values)}d", *values)
+
+    scale = 10 ** options.precision
+    quantized = [_quantize_int(v, scale) for v in current]
+    if options.encoding == "full":
+        return header + struct.pack(f"<{len(fields)}i", *quantized)
+    if previous is not None:
+        before = [_numeric(f, previous.data.get(f)) for f in fields]
+        before_q = [_quantize_int(v, scale) for v in before]
+        if any((a == QUANTIZED_MISSING) != (b == QUANTIZED_MISSING) for a, b in zip(quantized, before_q)):
+            # A value appeared or vanished; differences would be meaningless
+            return _encode_binary(options, tick, None)
+        diffs = [a - b for a, b in zip(quantized, before_q)]
+        if any(abs(d) >= QUANTIZED_LIMIT for d in diffs):
+            # A difference does not fit an int32; send absolute values instead
+            return _encode_binary(options, tick, None)
+        present = [i for i, d in enumerate(diffs) if d != 0]
+        values = [diffs[i] for i in present]
+    else:
+        present = list(range(len(fields)))
+        values = quantized
+    return header + _mask(len(fields), present) + struct.pack(f"<{len(values)}i", *values)
+
+
+def _quantize_int(value: float, scale: int) -> int:
+    if not math.isfinite(value):
+        return QUANTIZED_MISSING
+    quantized = round(value * scale)
+    return quantized if abs(quantized) < QUANTIZED_LIMIT else QUANTIZED_MISSING
+
+
+def _mask(n_fields: int, present) -> bytes:
+    mask = bytearray((n_fields + 7) // 8)
+    for i in present:
+        mask[i // 8] |= 1 << (i % 8)
+    return bytes(mask)
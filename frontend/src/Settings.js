@@ -9,7 +9,11 @@ function Settings() {
     weather_lon: 28.979,
     weather_cache_ttl: 60,
     ml_training_samples: 0,
-    ml_is_trained: false
+    ml_is_trained: false,
+    ml_forecast_engine: 'random_forest',
+    ml_forecast_engines: ['random_forest', 'online'],
+    ml_anomaly_engine: 'isolation_forest',
+    ml_anomaly_engines: ['isolation_forest', 'streaming']
   });
   const [loading, setLoading] = useState(false);
   const [message, setMessage] = useState('');
@@ -46,7 +50,7 @@ function Settings() {
       if (result.success) {
         showSuccess('Settings updated successfully!');
       } else {
-        showError('Settings update error: ' + result.message);
+        showError('Settings update error: ' + (result.error || result.message));
       }
     } catch (error) {
       showError('Settings update error: ' + error.message);
@@ -64,8 +68,17 @@ function Settings() {
         method: 'POST',
       });
       
-      const result = await response.json();
-      if (result.success) {
+      let result = await response.json();
+      if (result.job_id) {
+        // Training runs in the background; poll the job until it finishes
+        showInfo('Model training started...');
+        while (result.status === 'queued' || result.status === 'running') {
+          await new Promise(resolve => setTimeout(resolve, 1000));
+          const jobResponse = await fetch(`${API_URL}/ml/train/${result.job_id}`);
+          result = await jobResponse.json();
+        }
+      }
+      if (result.status === 'succeeded') {
         showSuccess(`Model trained successfully! ${result.samples_used} data samples used.`);
         fetchSettings(); // Ayarları yenile
       } else {
@@ -149,6 +162,34 @@ function Settings() {
             </span>
           </div>
         </div>
+
+        <div className="form-group">
+          <label>Forecast Engine:</label>
+          <select
+            value={settings.ml_forecast_engine}
+            onChange={(e) => handleInputChange('ml_forecast_engine', e.target.value)}
+          >
+            {settings.ml_forecast_engines.map(engine => (
+              <option key={engine} value={engine}>
+                {engine === 'online' ? 'Online (learns every point)' : 'Random Forest (batch trained)'}
+              </option>
+            ))}
+          </select>
+        </div>
+
+        <div className="form-group">
+          <label>Anomaly Engine:</label>
+          <select
+            value={settings.ml_anomaly_engine}
+            onChange={(e) => handleInputChange('ml_anomaly_engine', e.target.value)}
+          >
+            {settings.ml_anomaly_engines.map(engine => (
+              <option key={engine} value={engine}>
+                {engine === 'streaming' ? 'Streaming z-score (learns every point)' : 'Isolation Forest (batch trained)'}
+              </option>
+            ))}
+          </select>
+        </div>
         
         <button 
           className="train-button"